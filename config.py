@@ -1,9 +1,35 @@
 import os
 from dotenv import load_dotenv
+import atexit
 import base64
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
 
 load_dotenv()
 
+# ---- Logging ----
+# Records go through a queue; a background listener thread does the actual
+# stderr writes, so request handlers never block on I/O. LOG_LEVEL=WARNING
+# drops the per-turn info lines entirely.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler(sys.stderr)
+_log_stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+_log_listener = QueueListener(_log_queue, _log_stream_handler, respect_handler_level=True)
+
+_root_logger = logging.getLogger()
+if not any(isinstance(h, QueueHandler) for h in _root_logger.handlers):
+    _root_logger.addHandler(QueueHandler(_log_queue))
+    _root_logger.setLevel(LOG_LEVEL)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+logger = logging.getLogger(__name__)
+
 # All Groq API keys (gr_api_key1 ... gr_api_key6)
 GROQ_API_KEYS = [os.getenv(f"gr_api_key{i}") for i in range(1, 7)]
 NON_EMPTY_GROQ_KEYS = [k for k in GROQ_API_KEYS if k]
@@ -15,18 +41,96 @@ GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
 GOOGLE_CREDENTIALS_JSON_B64 = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON_B64")
 if not GOOGLE_CREDENTIALS_JSON and GOOGLE_CREDENTIALS_JSON_B64:
     try:
-        # some systems may include surrounding quotes; strip them
-        raw = GOOGLE_CREDENTIALS_JSON_B64.strip("\"'\n \r")
-        GOOGLE_CREDENTIALS_JSON = base64.b64decode(raw).decode("utf-8")
+        # some systems may include surrounding quotes; strip them. Whitespace
+        # needs no stripping: non-validating b64decode skips it.
+        raw = GOOGLE_CREDENTIALS_JSON_B64
+        if raw[0] in "\"'":
+            raw = raw.strip("\"'")
+        GOOGLE_CREDENTIALS_JSON = base64.b64decode(raw, validate=False).decode("utf-8")
     except Exception as e:
         # leave as None on failure; firebase_client will handle fallback and log
-        print(f"[config] Failed to decode GOOGLE_APPLICATION_CREDENTIALS_JSON_B64: {e}")
+        logger.warning(f"[config] Failed to decode GOOGLE_APPLICATION_CREDENTIALS_JSON_B64: {e}")
         GOOGLE_CREDENTIALS_JSON = None
 
+# Parsed once here so firebase_client can hand the dict straight to credentials.Certificate
+GOOGLE_CREDENTIALS_DICT = None
+if GOOGLE_CREDENTIALS_JSON:
+    try:
+        GOOGLE_CREDENTIALS_DICT = json.loads(GOOGLE_CREDENTIALS_JSON)
+    except Exception as e:
+        # firebase_client will log and fall back to default credentials
+        logger.warning(f"[config] Failed to parse Google credentials JSON: {e}")
+
 # Firestore collections (can override via env if you want)
 INTERVIEW_CONTEXT_COLLECTION = os.getenv("INTERVIEW_CONTEXT_COLLECTION", "interview_context")
 INTERVIEW_QUESTIONS_COLLECTION = os.getenv("INTERVIEW_QUESTIONS_COLLECTION", "interview_questions")
 
+# In-process cache for interview questions (seconds / max interviews kept)
+QUESTIONS_CACHE_TTL_SECONDS = float(os.getenv("QUESTIONS_CACHE_TTL_SECONDS", "300"))
+QUESTIONS_CACHE_MAXSIZE = int(os.getenv("QUESTIONS_CACHE_MAXSIZE", "1024"))
+
+# Interviews whose questions are kept live in memory via Firestore listeners
+# (comma-separated interview ids)
+HOT_INTERVIEW_IDS = [i.strip() for i in os.getenv("HOT_INTERVIEW_IDS", "").split(",") if i.strip()]
+
+# Number of recent candidate/interviewer turn pairs sent verbatim in each reply
+# prompt; older candidate answers are reduced to a one-line summary each
+CHAT_HISTORY_TURNS = max(0, int(os.getenv("CHAT_HISTORY_TURNS", "2")))
+
+# Backend for MiniLM embeddings: "onnx" (default), "openvino", "torch", or
+# "ctranslate2" (int8 model converted into EMBEDDINGS_CT2_MODEL_DIR with
+# ct2-transformers-converter --quantization int8)
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "onnx").lower()
+EMBEDDINGS_CT2_MODEL_DIR = os.getenv("EMBEDDINGS_CT2_MODEL_DIR", "miniLM-ct2")
+
+# Per-interview FAISS vectorstore cache. VECTORSTORE_CACHE_DIR (unset = memory
+# only) also persists built indexes so a cold process can reload them.
+VECTORSTORE_CACHE_TTL_SECONDS = float(os.getenv("VECTORSTORE_CACHE_TTL_SECONDS", "600"))
+VECTORSTORE_CACHE_MAXSIZE = int(os.getenv("VECTORSTORE_CACHE_MAXSIZE", "64"))
+VECTORSTORE_CACHE_DIR = os.getenv("VECTORSTORE_CACHE_DIR")
+
+# Context collections with at least this many docs get an HNSW index
+# (sublinear search) instead of FAISS's brute-force flat index
+VECTORSTORE_HNSW_MIN_DOCS = int(os.getenv("VECTORSTORE_HNSW_MIN_DOCS", "1000"))
+
+# How long an identical transcript reuses its previous final score (seconds)
+SCORE_CACHE_TTL_SECONDS = float(os.getenv("SCORE_CACHE_TTL_SECONDS", "600"))
+
+# Worker threads for blocking STT/LLM/TTS/Firestore calls run via asyncio.to_thread
+THREAD_POOL_WORKERS = int(os.getenv("THREAD_POOL_WORKERS", "64"))
+
+# Upper bound on waiting for the final score before closing the socket (seconds)
+FINAL_SCORE_TIMEOUT_SECONDS = float(os.getenv("FINAL_SCORE_TIMEOUT_SECONDS", "60"))
+
+# Read/write timeout of the shared Groq HTTP pools (STT uploads, TTS, every LLM
+# call); the default matches the Groq SDK's own 60s. Connects time out after 5s.
+GROQ_HTTP_TIMEOUT_SECONDS = float(os.getenv("GROQ_HTTP_TIMEOUT_SECONDS", "60"))
+
+# Max verified Firebase ID tokens kept in memory (entries always expire at the token's exp)
+TOKEN_CACHE_MAXSIZE = int(os.getenv("TOKEN_CACHE_MAXSIZE", "10000"))
+
+# Largest streamed answer (audioStream=1) buffered before it is rejected;
+# matches Whisper's 25 MB upload limit
+MAX_UTTERANCE_BYTES = int(os.getenv("MAX_UTTERANCE_BYTES", str(25 * 1024 * 1024)))
+
+# Async TTS starts the next key if the current one hasn't answered in this long
+TTS_HEDGE_DELAY_SECONDS = float(os.getenv("TTS_HEDGE_DELAY_SECONDS", "2"))
+
+# Synthesized TTS clips kept in memory by (model, voice, text), e.g. the intro
+# and repeated prompts; each WAV is ~50-500 KB
+TTS_CACHE_MAXSIZE = int(os.getenv("TTS_CACHE_MAXSIZE", "128"))
+
+# TTS keys rate-limited without a Retry-After header are skipped for this long
+TTS_KEY_COOLDOWN_SECONDS = float(os.getenv("TTS_KEY_COOLDOWN_SECONDS", "30"))
+
+# LLM keys that hit a rate limit or server error are tried last for this long
+LLM_KEY_COOLDOWN_SECONDS = float(os.getenv("LLM_KEY_COOLDOWN_SECONDS", "30"))
+
+# Queued response writes (from all connections) are committed in one
+# WriteBatch once this many are waiting or RESPONSE_FLUSH_INTERVAL_MS has passed
+RESPONSE_BATCH_SIZE = int(os.getenv("RESPONSE_BATCH_SIZE", "500"))
+RESPONSE_FLUSH_INTERVAL_MS = float(os.getenv("RESPONSE_FLUSH_INTERVAL_MS", "100"))
+
 # LLM key (can override via GROQ_LLM_API_KEY env)
 GROQ_LLM_API_KEY = (
     os.getenv("GROQ_LLM_API_KEY")
@@ -1,7 +1,11 @@
-import uuid
-import json
+import datetime
+import hashlib
+import logging
 import os
-from typing import List, Optional, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple
 
 import firebase_admin
 from firebase_admin import credentials, firestore
@@ -10,80 +14,203 @@ from config import (
     GOOGLE_CREDENTIALS_PATH,
     # JSON string form of credentials for env-only deployments
     GOOGLE_CREDENTIALS_JSON,
+    GOOGLE_CREDENTIALS_DICT,
     INTERVIEW_QUESTIONS_COLLECTION,
+    QUESTIONS_CACHE_TTL_SECONDS,
+    QUESTIONS_CACHE_MAXSIZE,
 )
 
+logger = logging.getLogger(__name__)
+
 # ---- Firebase init ----
 if not firebase_admin._apps:
     # Prefer an explicit file path if it exists
     if GOOGLE_CREDENTIALS_PATH and os.path.exists(GOOGLE_CREDENTIALS_PATH):
-        print(f"[Firebase] Initializing from credentials file: {GOOGLE_CREDENTIALS_PATH}")
+        logger.info("[Firebase] Initializing from credentials file: %s", GOOGLE_CREDENTIALS_PATH)
         cred = credentials.Certificate(GOOGLE_CREDENTIALS_PATH)
         firebase_admin.initialize_app(cred)
     # If a JSON string is provided (useful for deployments), parse and use it
     elif GOOGLE_CREDENTIALS_JSON:
         try:
-            print("[Firebase] Initializing from credentials provided in environment (GOOGLE_APPLICATION_CREDENTIALS_JSON or decoded B64)")
-            cred_dict = json.loads(GOOGLE_CREDENTIALS_JSON)
-            cred = credentials.Certificate(cred_dict)
+            if GOOGLE_CREDENTIALS_DICT is None:
+                raise ValueError("credentials JSON could not be parsed (see [config] log)")
+            logger.info("[Firebase] Initializing from credentials provided in environment (GOOGLE_APPLICATION_CREDENTIALS_JSON or decoded B64)")
+            cred = credentials.Certificate(GOOGLE_CREDENTIALS_DICT)
             firebase_admin.initialize_app(cred)
         except Exception as e:
             # Fall back to initialize_app() to allow other auth methods, but log error
-            print(f"[Firebase] Failed to parse GOOGLE_CREDENTIALS_JSON: {e}")
-            print("[Firebase] Falling back to default firebase_admin.initialize_app()")
+            logger.warning(f"[Firebase] Failed to load GOOGLE_CREDENTIALS_JSON: {e}")
+            logger.warning("[Firebase] Falling back to default firebase_admin.initialize_app()")
             firebase_admin.initialize_app()
     else:
-        print("[Firebase] No credentials provided; initializing default app (may fail if no default credentials available)")
+        logger.warning("[Firebase] No credentials provided; initializing default app (may fail if no default credentials available)")
         firebase_admin.initialize_app()
 
 db = firestore.client()
 
 
+def _missing_first(value: Any) -> Tuple[bool, Any]:
+    # Sort key that puts docs lacking the field first without comparing None to values
+    return (value is not None, value)
+
+
+def _stream_ordered(query: Any, field: str) -> List[Dict[str, Any]]:
+    """
+    Doc dicts of query, ordered server-side with order_by(field).
+    order_by skips docs that lack the field, so a count() aggregation checks
+    for them; only when some are missing (or count() is unavailable) is the
+    query streamed again and those docs merged in, first.
+    """
+    docs = list(query.order_by(field).stream())
+    try:
+        total = query.count().get()[0][0].value
+    except Exception as e:
+        logger.debug("[Firebase] count() unavailable, re-reading %s unordered: %s", field, e)
+        total = None
+    datas = [d.to_dict() or {} for d in docs]
+    if total == len(docs):
+        return datas
+    seen = {d.id for d in docs}
+    missing = [d.to_dict() or {} for d in query.stream() if d.id not in seen]
+    # Stable and near-linear on already sorted input; also places docs that
+    # gained the field between the two reads
+    return sorted(missing + datas, key=lambda data: _missing_first(data.get(field)))
+
+
 # ---- Interview questions ----
 
+# Shared pool for running independent Firestore queries concurrently
+_query_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="firestore-query")
+
+# In-process cache: interview_id -> (loaded_at, questions)
+_QUESTIONS_CACHE: Dict[str, Tuple[float, List[str]]] = {}
+_QUESTIONS_CACHE_LOCK = threading.Lock()
+
+
+def invalidate_interview_questions(interview_id: Optional[str] = None):
+    """Drop cached questions for one interview (or all when interview_id is None)."""
+    with _QUESTIONS_CACHE_LOCK:
+        if interview_id is None:
+            _QUESTIONS_CACHE.clear()
+        else:
+            _QUESTIONS_CACHE.pop(interview_id, None)
+
+
+# Live question lists kept current by on_snapshot listeners for "hot" interviews
+_WATCHED_QUESTIONS: Dict[str, List[str]] = {}
+_QUESTION_WATCHES: Dict[str, Any] = {}
+
+
+def watch_interview_questions(interview_id: str):
+    """
+    Register an on_snapshot listener on interviews/{interviewId}/questions so
+    the question list is pushed into memory on every change instead of being
+    re-streamed on each connect.
+    """
+    if interview_id in _QUESTION_WATCHES:
+        return
+
+    def _on_snapshot(doc_snapshots, changes, read_time):
+        # The listener covers the whole subcollection (an order_by query would
+        # never report docs without 'order'), so it's sorted here
+        datas = sorted((d.to_dict() or {} for d in doc_snapshots), key=lambda data: _missing_first(data.get("order")))
+        questions = _question_texts(datas)
+        with _QUESTIONS_CACHE_LOCK:
+            if questions:
+                _WATCHED_QUESTIONS[interview_id] = questions
+            else:
+                # Nothing in the subcollection; let the normal load path decide
+                _WATCHED_QUESTIONS.pop(interview_id, None)
+        logger.debug("[Interview] Listener refreshed %s questions for interview %s", len(questions), interview_id)
+
+    sub_ref = db.collection("interviews").document(interview_id).collection("questions")
+    _QUESTION_WATCHES[interview_id] = sub_ref.on_snapshot(_on_snapshot)
+    logger.info("[Interview] Watching questions for interview %s", interview_id)
+
+
+def unwatch_interview_questions():
+    """Unsubscribe all question listeners (call on shutdown)."""
+    for interview_id, watch in list(_QUESTION_WATCHES.items()):
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            logger.error(f"[Interview] Error unsubscribing listener for {interview_id}: {e}")
+    _QUESTION_WATCHES.clear()
+    with _QUESTIONS_CACHE_LOCK:
+        _WATCHED_QUESTIONS.clear()
+
+
 def load_interview_questions(interview_id: str) -> List[str]:
+    """
+    Return the questions for an interview. Watched (hot) interviews are served
+    from their listener, others from an in-process TTL cache when possible.
+    On a miss, questions are loaded from Firestore (see
+    _fetch_interview_questions).
+    """
+    now = time.monotonic()
+    with _QUESTIONS_CACHE_LOCK:
+        watched = _WATCHED_QUESTIONS.get(interview_id)
+        if watched:
+            return list(watched)
+        cached = _QUESTIONS_CACHE.get(interview_id)
+        if cached and now - cached[0] < QUESTIONS_CACHE_TTL_SECONDS:
+            logger.debug("[Interview] Using cached questions for interview %s", interview_id)
+            return list(cached[1])
+
+    questions = _fetch_interview_questions(interview_id)
+
+    with _QUESTIONS_CACHE_LOCK:
+        if len(_QUESTIONS_CACHE) >= QUESTIONS_CACHE_MAXSIZE:
+            # Evict the oldest entry
+            oldest = min(_QUESTIONS_CACHE, key=lambda k: _QUESTIONS_CACHE[k][0])
+            _QUESTIONS_CACHE.pop(oldest, None)
+        _QUESTIONS_CACHE[interview_id] = (now, list(questions))
+    return questions
+
+
+def _question_texts(datas) -> List[str]:
+    """Pull the 'text' field out of question doc dicts, in order, skipping empty ones."""
+    return [data["text"] for data in datas if data.get("text")]
+
+
+def _fetch_subcollection_questions(interview_id: str) -> List[str]:
+    # Ordered by 'order' server-side; docs without it come first
+    sub_ref = db.collection("interviews").document(interview_id).collection("questions")
+    return _question_texts(_stream_ordered(sub_ref, "order"))
+
+
+def _fetch_global_questions(interview_id: str) -> List[str]:
+    col_ref = db.collection(INTERVIEW_QUESTIONS_COLLECTION)
+    return _question_texts(d.to_dict() or {} for d in col_ref.where("interviewId", "==", interview_id).stream())
+
+
+def _fetch_interview_questions(interview_id: str) -> List[str]:
     """
     Try to load questions from:
     1) interviews/{interviewId}/questions subcollection, ordered by 'order'
     2) global INTERVIEW_QUESTIONS_COLLECTION where interviewId == interview_id
+    Both queries run concurrently; the subcollection wins when it has questions.
     If none found, return a simple default list.
     """
-    questions: List[str] = []
+    sub_future = _query_executor.submit(_fetch_subcollection_questions, interview_id)
+    global_future = _query_executor.submit(_fetch_global_questions, interview_id)
 
     # Option 1: subcollection under interviews/{interview_id}/questions
-    sub_ref = db.collection("interviews").document(interview_id).collection("questions")
-    sub_docs = list(sub_ref.stream())
-    if sub_docs:
-        sub_docs_sorted = sorted(
-            sub_docs,
-            key=lambda d: (d.to_dict() or {}).get("order", 0)
-        )
-        for d in sub_docs_sorted:
-            data = d.to_dict() or {}
-            q_text = data.get("text")
-            if q_text:
-                questions.append(q_text)
-
+    questions = sub_future.result()
     if questions:
-        print(f"[Interview] Loaded {len(questions)} questions from interviews/{interview_id}/questions")
+        # Global result is not needed; drop it if it hasn't started yet
+        global_future.cancel()
+        logger.info("[Interview] Loaded %s questions from interviews/%s/questions", len(questions), interview_id)
         return questions
 
     # Option 2: global collection with interviewId field
-    col_ref = db.collection(INTERVIEW_QUESTIONS_COLLECTION)
-    global_docs = list(col_ref.where("interviewId", "==", interview_id).stream())
-    questions = []
-    for d in global_docs:
-        data = d.to_dict() or {}
-        q_text = data.get("text")
-        if q_text:
-            questions.append(q_text)
-
+    questions = global_future.result()
     if questions:
-        print(f"[Interview] Loaded {len(questions)} questions from '{INTERVIEW_QUESTIONS_COLLECTION}' for interviewId={interview_id}")
+        logger.info("[Interview] Loaded %s questions from '%s' for interviewId=%s", len(questions), INTERVIEW_QUESTIONS_COLLECTION, interview_id)
         return questions
 
     # Fallback: default questions
-    print("[Interview] No questions found in Firestore. Using default questions.")
+    logger.info("[Interview] No questions found in Firestore. Using default questions.")
     return [
         "Can you briefly introduce yourself?",
         "Why are you interested in this role?",
@@ -93,6 +220,86 @@ def load_interview_questions(interview_id: str) -> List[str]:
 
 # ---- Candidate responses ----
 
+# Firestore caps a WriteBatch at 500 operations
+MAX_BATCH_WRITES = 500
+RESPONSE_BATCH_ATTEMPTS = 3
+
+
+def _response_doc_id(
+    session_nonce: str, user_id: str, attempt_number: int, question_index: int, answer_text: str
+) -> str:
+    key = f"{session_nonce}\0{user_id}\0{attempt_number}\0{question_index}\0{answer_text}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_user_response(
+    interview_id: str,
+    user_id: str,
+    question_index: int,
+    question_text: str,
+    answer_text: str,
+    metrics: Optional[Dict[str, Any]] = None,
+    attempt_number: int = 1,
+    session_nonce: str = "",
+) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Build the (doc_ref, payload) for one response at
+    interviews/{interviewId}/responses/{responseId} without writing it.
+    responseId is derived from the response and session_nonce (one per
+    websocket connection), so re-committing the same write (e.g. retrying a
+    failed batch) overwrites instead of duplicating, while the same answer
+    given in another session gets its own document.
+    """
+    doc_ref = (
+        db.collection("interviews")
+        .document(interview_id)
+        .collection("responses")
+        .document(_response_doc_id(session_nonce, user_id, attempt_number, question_index, answer_text))
+    )
+    server_ts = getattr(firestore, "SERVER_TIMESTAMP", None)
+    payload = {
+        "interviewId": interview_id,
+        "userId": user_id,
+        "questionIndex": question_index,
+        "question": question_text,
+        "answer": answer_text,
+        "metrics": metrics or {},
+        "attemptNumber": attempt_number,
+        "createdAt": server_ts,
+    }
+    return doc_ref, payload
+
+
+def commit_response_batch(writes: List[Tuple[Any, Dict[str, Any]]]) -> List[Tuple[Any, Dict[str, Any]]]:
+    """
+    Commit (doc_ref, payload) writes in WriteBatches of up to 500, retrying
+    each batch RESPONSE_BATCH_ATTEMPTS times. Returns the writes that still
+    failed, so the caller can re-queue them instead of losing answers.
+    """
+    committed = 0
+    failed: List[Tuple[Any, Dict[str, Any]]] = []
+    for start in range(0, len(writes), MAX_BATCH_WRITES):
+        chunk = writes[start:start + MAX_BATCH_WRITES]
+        # Doc IDs are deterministic, so a retried batch can't duplicate responses
+        for attempt in range(1, RESPONSE_BATCH_ATTEMPTS + 1):
+            try:
+                batch = db.batch()
+                for doc_ref, payload in chunk:
+                    batch.set(doc_ref, payload)
+                batch.commit()
+                committed += len(chunk)
+                break
+            except Exception as e:
+                logger.error(f"[Interview] Error committing {len(chunk)} batched response(s) (attempt {attempt}/{RESPONSE_BATCH_ATTEMPTS}): {e}")
+                if attempt < RESPONSE_BATCH_ATTEMPTS:
+                    time.sleep(0.2 * attempt)
+        else:
+            failed.extend(chunk)
+    if committed:
+        logger.info("[Interview] Committed %s batched response(s)", committed)
+    return failed
+
+
 def save_user_response(
     interview_id: str,
     user_id: str,
@@ -101,34 +308,36 @@ def save_user_response(
     answer_text: str,
     metrics: Optional[Dict[str, Any]] = None,
     attempt_number: int = 1,
+    session_nonce: str = "",
 ):
     """
     Store every user response in Firestore under:
-    interviews/{interviewId}/responses/{autoId}
+    interviews/{interviewId}/responses/{responseId} (see build_user_response)
     """
     try:
-        doc_ref = (
-            db.collection("interviews")
-            .document(interview_id)
-            .collection("responses")
-            .document()
-        )
-        server_ts = getattr(firestore, "SERVER_TIMESTAMP", None)
-        doc_ref.set(
-            {
-                "interviewId": interview_id,
-                "userId": user_id,
-                "questionIndex": question_index,
-                "question": question_text,
-                "answer": answer_text,
-                "metrics": metrics or {},
-                "attemptNumber": attempt_number,
-                "createdAt": server_ts,
-            }
+        doc_ref, payload = build_user_response(
+            interview_id, user_id, question_index, question_text, answer_text,
+            metrics=metrics, attempt_number=attempt_number, session_nonce=session_nonce,
         )
-        print(f"[Interview] Saved response for interview={interview_id}, q_index={question_index}")
+        doc_ref.set(payload)
+        logger.info("[Interview] Saved response for interview=%s, q_index=%s", interview_id, question_index)
+    except Exception as e:
+        logger.error(f"[Interview] Error saving response: {e}")
+
+
+def get_next_attempt_number(interview_id: str) -> int:
+    """
+    Return the attempt number the next completed interview will get
+    (current attempt_count + 1). Only reads the attempt_count field.
+    """
+    try:
+        snap = db.collection("interviews").document(interview_id).get(field_paths=["attempt_count"])
+        if snap.exists:
+            data = snap.to_dict() or {}
+            return (data.get("attempt_count", 0) or 0) + 1
     except Exception as e:
-        print(f"[Interview] Error saving response: {e}")
+        logger.error(f"[Interview] Error reading attempt count: {e}")
+    return 1
 
 
 def save_interview_score(
@@ -140,57 +349,106 @@ def save_interview_score(
     """
     Store the final interview score in Firestore.
     Saved to: interviews/{interviewId}
-    Also increments the attempt count for this user on this interview.
+    Also atomically increments the attempt count for this user on this interview.
     Returns the attempt count.
     """
     try:
         doc_ref = db.collection("interviews").document(interview_id)
         server_ts = getattr(firestore, "SERVER_TIMESTAMP", None)
-        
-        # Get current attempt count (if any)
-        existing_doc = doc_ref.get()
-        attempt_count = 1
-        if existing_doc.exists:
-            data = existing_doc.to_dict() or {}
-            attempt_count = (data.get("attempt_count", 0) or 0) + 1
-        
+
+        # Single atomic write; no read-modify-write race between attempts
         doc_ref.set(
             {
                 "interviewId": interview_id,
                 "userId": user_id,
                 "score": score,
                 "justification": justification,
-                "attempt_count": attempt_count,
+                "attempt_count": firestore.Increment(1),
                 "completedAt": server_ts,
             },
             merge=True  # Merge with existing document if any metadata already exists
         )
-        print(f"[Interview] Saved final score {score}/100 for interview={interview_id} (attempt #{attempt_count})")
+
+        # Read back only the incremented counter for the caller
+        snap = doc_ref.get(field_paths=["attempt_count"])
+        attempt_count = ((snap.to_dict() or {}).get("attempt_count") or 1) if snap.exists else 1
+        logger.info("[Interview] Saved final score %s/100 for interview=%s (attempt #%s)", score, interview_id, attempt_count)
         return attempt_count
     except Exception as e:
-        print(f"[Interview] Error saving score: {e}")
+        logger.error(f"[Interview] Error saving score: {e}")
         return 1
 
 
+# ---- Final score cache ----
+
+def load_cached_score(
+    interview_id: str,
+    cache_key: str,
+    max_age_seconds: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Read a cached score from interviews/{interviewId}/scoreCache/{cacheKey}.
+    Entries older than max_age_seconds (if given) are ignored.
+    """
+    try:
+        snap = (
+            db.collection("interviews")
+            .document(interview_id)
+            .collection("scoreCache")
+            .document(cache_key)
+            .get()
+        )
+        if snap.exists:
+            data = snap.to_dict() or {}
+            created_at = data.get("createdAt")
+            if max_age_seconds is not None and isinstance(created_at, datetime.datetime):
+                age = (datetime.datetime.now(datetime.timezone.utc) - created_at).total_seconds()
+                if age > max_age_seconds:
+                    return None
+            if "score" in data and "justification" in data:
+                return {"score": data["score"], "justification": data["justification"]}
+    except Exception as e:
+        logger.error(f"[Interview] Error reading cached score: {e}")
+    return None
+
+
+def save_cached_score(interview_id: str, cache_key: str, score_result: Dict[str, Any]):
+    """Persist a score so other replicas can reuse it for the same transcript."""
+    try:
+        server_ts = getattr(firestore, "SERVER_TIMESTAMP", None)
+        (
+            db.collection("interviews")
+            .document(interview_id)
+            .collection("scoreCache")
+            .document(cache_key)
+            .set(
+                {
+                    "score": score_result["score"],
+                    "justification": score_result["justification"],
+                    "createdAt": server_ts,
+                }
+            )
+        )
+    except Exception as e:
+        logger.error(f"[Interview] Error caching score: {e}")
+
+
 def get_session_with_events(user_id: str, session_id: str) -> Dict[str, Any]:
     """
     Fetch a user's session document and its `events` subcollection.
 
     Returns a dict: {"session": <session_doc_or_None>, "events": [event_dicts...]}
-    Events are sorted by `timestamp` (ascending).
+    Events are sorted by `timestamp` (ascending); events without one sort first.
     """
     try:
         session_ref = db.collection("users").document(user_id).collection("sessions").document(session_id)
         session_doc = session_ref.get()
         session = session_doc.to_dict() if session_doc.exists else None
 
-        events_ref = session_ref.collection("events")
-        events = [ (e.id, e.to_dict() or {}) for e in events_ref.stream() ]
-        # Extract dicts and sort by timestamp if present
-        events_only = [e for (_id, e) in events]
-        events_sorted = sorted(events_only, key=lambda x: x.get("timestamp", 0))
+        # Ordered server-side; events without a timestamp are merged in first
+        events = _stream_ordered(session_ref.collection("events"), "timestamp")
 
-        return {"session": session, "events": events_sorted}
+        return {"session": session, "events": events}
     except Exception as e:
-        print(f"[Firebase] Error fetching session/events for {user_id}/{session_id}: {e}")
+        logger.error(f"[Firebase] Error fetching session/events for {user_id}/{session_id}: {e}")
         return {"session": None, "events": []}
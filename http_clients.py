@@ -0,0 +1,25 @@
+import logging
+
+import httpx
+
+from config import GROQ_HTTP_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Long-lived keep-alive pools shared by every Groq client (STT, LLM, TTS) and
+# every key, so calls reuse an open TLS connection instead of handshaking per
+# request or per key.
+_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+_TIMEOUT = httpx.Timeout(GROQ_HTTP_TIMEOUT_SECONDS, connect=5.0)
+
+
+def _make_client(client_cls):
+    try:
+        return client_cls(http2=True, limits=_LIMITS, timeout=_TIMEOUT)
+    except ImportError as e:  # h2 not installed
+        logger.warning(f"[HTTP] HTTP/2 unavailable, using HTTP/1.1 keep-alive pool: {e}")
+        return client_cls(limits=_LIMITS, timeout=_TIMEOUT)
+
+
+groq_http_client = _make_client(httpx.Client)
+groq_async_http_client = _make_client(httpx.AsyncClient)
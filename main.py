@@ -1,29 +1,210 @@
 # main.py
+import asyncio
+import hashlib
+import itertools
+import logging
 import os
-import tempfile
-import json
+import threading
 import uuid
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+import msgspec
 import uvicorn
 from groq import Groq
 
 from firebase_admin import auth as firebase_auth
 
-from config import NON_EMPTY_GROQ_KEYS
-from firebase_client import load_interview_questions, save_user_response, save_interview_score
-from rag import generate_interviewer_reply, generate_final_score
-from tts import tts_text_to_base64_wav
+from config import (
+    NON_EMPTY_GROQ_KEYS,
+    HOT_INTERVIEW_IDS,
+    CHAT_HISTORY_TURNS,
+    THREAD_POOL_WORKERS,
+    FINAL_SCORE_TIMEOUT_SECONDS,
+    TOKEN_CACHE_MAXSIZE,
+    RESPONSE_BATCH_SIZE,
+    RESPONSE_FLUSH_INTERVAL_MS,
+    MAX_UTTERANCE_BYTES,
+)
+from firebase_client import (
+    load_interview_questions,
+    build_user_response,
+    commit_response_batch,
+    save_user_response,
+    save_interview_score,
+    get_next_attempt_number,
+    watch_interview_questions,
+    unwatch_interview_questions,
+    invalidate_interview_questions,
+)
+from rag import (
+    generate_interviewer_reply,
+    astream_interviewer_sentences,
+    get_or_generate_final_score,
+    build_vectorstore_from_firestore,
+    invalidate_vectorstore,
+    history_message,
+    format_history_line,
+    summarize_answer,
+)
+from tts import b64encode_str, tts_text_to_wav_bytes_async, tts_cache_info
+from http_clients import groq_http_client
+
+logger = logging.getLogger(__name__)
+
+# msgspec's reusable C encoders/decoder handle every payload, JSON and
+# MessagePack alike (int dict keys are written as strings in JSON)
+_json_encoder = msgspec.json.Encoder()
+_json_decoder = msgspec.json.Decoder()
+_msgpack_encoder = msgspec.msgpack.Encoder()
+
+
+def json_dumps(obj) -> str:
+    return _json_encoder.encode(obj).decode("utf-8")
+
+
+json_loads = _json_decoder.decode
+msgpack_dumps = _msgpack_encoder.encode
+
 
 # ---- Groq client for STT (Whisper) ----
 
 if not NON_EMPTY_GROQ_KEYS:
     raise RuntimeError("No Groq API keys configured for STT (Whisper).")
 
-stt_api_key = NON_EMPTY_GROQ_KEYS[-1]  # choose one key for STT
-client_stt = Groq(api_key=stt_api_key)
+# One client per key; transcriptions are spread round-robin across all of them
+stt_clients = [Groq(api_key=k, http_client=groq_http_client) for k in NON_EMPTY_GROQ_KEYS]
+_stt_counter = itertools.count()
+
+
+def transcribe_audio(audio_bytes: bytes) -> str:
+    """
+    Transcribe audio with Whisper, starting from the next client in the
+    round-robin and failing over to the others. Returns "" if all fail.
+    """
+    start = next(_stt_counter)
+    for offset in range(len(stt_clients)):
+        i = (start + offset) % len(stt_clients)
+        try:
+            resp = stt_clients[i].audio.transcriptions.create(
+                file=("audio.webm", audio_bytes),
+                model="whisper-large-v3-turbo",
+                response_format="json",  # only .text is used; skip segment timestamps
+            )
+            return getattr(resp, "text", "") or ""
+        except Exception as e:
+            logger.error(f"[STT] Client {i + 1}/{len(stt_clients)} transcription error: {e}")
+    return ""
+
+# ---- Firebase ID-token verification cache ----
+
+# blake2b(id_token) -> (decoded claims, exp as unix seconds), least recently used first.
+# Shared by all connections, so reconnects with the same token skip verification.
+_token_cache: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+
+def _token_cache_key(id_token: str) -> bytes:
+    return hashlib.blake2b(id_token.encode("utf-8"), digest_size=16).digest()
+
+
+def lookup_cached_token(id_token: str) -> Optional[dict]:
+    """Return cached claims for a still-valid token, or None (cheap; safe on the event loop)."""
+    key = _token_cache_key(id_token)
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+        if cached is None:
+            return None
+        if time.time() < cached[1]:
+            _token_cache.move_to_end(key)
+            return cached[0]
+        # Always honor exp: drop the stale entry so it gets verified again
+        del _token_cache[key]
+    return None
+
+
+def verify_id_token_cached(id_token: str) -> dict:
+    """
+    Verify a Firebase ID token, reusing previously verified claims for the
+    same token until it expires (skips the JWT signature check on reconnects).
+    Blocking on a miss (RSA verify, possibly a key fetch); run it in a thread.
+    """
+    cached = lookup_cached_token(id_token)
+    if cached is not None:
+        return cached
+
+    decoded = firebase_auth.verify_id_token(id_token)
+
+    with _token_cache_lock:
+        _token_cache[_token_cache_key(id_token)] = (decoded, float(decoded.get("exp", 0)))
+        while len(_token_cache) > TOKEN_CACHE_MAXSIZE:
+            _token_cache.popitem(last=False)
+    return decoded
+
+
+# ---- Per-connection session state ----
+
+@dataclass(slots=True)
+class SessionState:
+    # Full transcript (used for final scoring)
+    chat_hist: List[Dict[str, str]]
+    # Frontend audio metrics, indexed by question index (None until received)
+    metrics: List[Optional[Dict[str, Any]]]
+    # Last CHAT_HISTORY_TURNS user/assistant pairs as prebuilt chat messages,
+    # fed to the per-turn LLM prompt
+    recent_messages: Deque[Any] = field(
+        default_factory=lambda: deque(maxlen=2 * CHAT_HISTORY_TURNS)
+    )
+    # One-line summaries of candidate answers that fell out of recent_messages
+    # (every answer when CHAT_HISTORY_TURNS=0)
+    summary_lines: List[str] = field(default_factory=list)
+    # Transcript lines for final scoring, appended one per message and joined once
+    history_lines: List[str] = field(default_factory=list)
+
+    def add_message(self, role: str, content: str):
+        """Record a message once; history views are extended, never rebuilt."""
+        self.chat_hist.append({"role": role, "content": content})
+        message = history_message(role, content)
+        if message is not None:
+            if not self.recent_messages.maxlen:
+                # CHAT_HISTORY_TURNS=0: no verbatim turns, every answer goes straight to the summary
+                if message.type == "human":
+                    self.summary_lines.append(summarize_answer(len(self.summary_lines) + 1, message.content))
+            else:
+                if len(self.recent_messages) == self.recent_messages.maxlen:
+                    evicted = self.recent_messages[0]
+                    if evicted.type == "human":
+                        self.summary_lines.append(summarize_answer(len(self.summary_lines) + 1, evicted.content))
+                self.recent_messages.append(message)
+        line = format_history_line(role, content)
+        if line is not None:
+            self.history_lines.append(line)
+
+    def metrics_by_question(self, last_index: int) -> Dict[int, Dict[str, Any]]:
+        """Metrics for questions 0..last_index, in the shape generate_final_score expects."""
+        return {i: self.metrics[i] or {} for i in range(last_index + 1)}
+
+
+# ---- RAG retriever ----
+
+def build_interview_retriever(interview_id: str):
+    """Build the interview-specific vectorstore and return its retriever (or None)."""
+    try:
+        logger.info("[Interview] Building RAG vectorstore for interview %s", interview_id)
+        interview_vectorstore = build_vectorstore_from_firestore(interview_id)
+        if interview_vectorstore:
+            logger.info("[Interview] RAG vectorstore ready for %s", interview_id)
+            return interview_vectorstore.as_retriever(search_kwargs={"k": 4})
+        logger.info("[Interview] No RAG context found for %s", interview_id)
+    except Exception as e:
+        logger.error(f"[Interview] Error building vectorstore: {e}")
+    return None
+
 
 # ---- FastAPI app ----
 
@@ -38,11 +219,299 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def configure_thread_pool():
+    # asyncio.to_thread uses the loop's default executor; size it for the
+    # blocking Groq/Firestore calls of many concurrent interviews
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(max_workers=THREAD_POOL_WORKERS, thread_name_prefix="interview-io")
+    )
+
+
+@app.on_event("startup")
+async def start_question_listeners():
+    for interview_id in HOT_INTERVIEW_IDS:
+        try:
+            watch_interview_questions(interview_id)
+        except Exception as e:
+            logger.warning(f"[Interview] Could not watch questions for {interview_id}: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_question_listeners():
+    unwatch_interview_questions()
+
+
+# ---- Background response writes ----
+
+# (doc_ref, payload) writes from every connection, committed by one drain task
+_response_queue: Optional[asyncio.Queue] = None
+_response_drain_task: Optional[asyncio.Task] = None
+# Direct saves used when the drain task isn't running; held here so they
+# aren't garbage-collected before they finish
+_pending_saves: Set[asyncio.Task] = set()
+# Pause before re-queueing a batch that failed all its commit attempts
+RESPONSE_REQUEUE_DELAY_SECONDS = 1.0
+
+
+async def _drain_responses(queue: asyncio.Queue):
+    """
+    Commit queued responses in batches of up to RESPONSE_BATCH_SIZE or every
+    RESPONSE_FLUSH_INTERVAL_MS. Writes that fail every commit attempt go back
+    on the queue; anything still unsent at shutdown is logged in full.
+    """
+    loop = asyncio.get_running_loop()
+    max_writes = max(1, RESPONSE_BATCH_SIZE)
+    while True:
+        writes = [await queue.get()]
+        deadline = loop.time() + RESPONSE_FLUSH_INTERVAL_MS / 1000
+        while len(writes) < max_writes:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                writes.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        failed = []
+        try:
+            failed = await asyncio.to_thread(commit_response_batch, writes)
+            if failed:
+                # Re-queue before task_done so queue.join() keeps waiting for them
+                logger.error(f"[Interview] Re-queueing {len(failed)} response(s) that exhausted their retries")
+                await asyncio.sleep(RESPONSE_REQUEUE_DELAY_SECONDS)
+                for write in failed:
+                    queue.put_nowait(write)
+                failed = []
+        except asyncio.CancelledError:
+            # Cancelled while waiting to re-queue (a commit in progress still
+            # finishes in its thread)
+            _log_lost_responses(failed)
+            raise
+        finally:
+            for _ in writes:
+                queue.task_done()
+
+
+def _log_lost_responses(writes: List[Tuple[Any, Dict[str, Any]]]):
+    """Log each response that will never reach Firestore, so it can be recovered from logs."""
+    for _, payload in writes:
+        logger.error(
+            "[Interview] Lost response: interview=%s user=%s q_index=%s attempt=%s answer=%r",
+            payload.get("interviewId"), payload.get("userId"), payload.get("questionIndex"),
+            payload.get("attemptNumber"), payload.get("answer"),
+        )
+
+
+def enqueue_user_response(**kwargs) -> bool:
+    """Queue a response write for the drain task. Returns False if the task isn't running."""
+    if _response_queue is None:
+        return False
+    try:
+        _response_queue.put_nowait(build_user_response(**kwargs))
+        return True
+    except Exception as e:
+        logger.error(f"[Interview] Error queueing response: {e}")
+        return False
+
+
+@app.on_event("startup")
+async def start_response_writer():
+    global _response_queue, _response_drain_task
+    _response_queue = asyncio.Queue()
+    _response_drain_task = asyncio.create_task(_drain_responses(_response_queue))
+
+
+@app.on_event("shutdown")
+async def stop_response_writer():
+    global _response_queue
+    queue, _response_queue = _response_queue, None
+    if queue is not None:
+        # Let the drain task commit whatever is still queued
+        try:
+            await asyncio.wait_for(queue.join(), timeout=10)
+        except asyncio.TimeoutError:
+            logger.error(f"[Interview] {queue.qsize()} queued response(s) not committed at shutdown")
+            _log_lost_responses([queue.get_nowait() for _ in range(queue.qsize())])
+    if _response_drain_task is not None:
+        _response_drain_task.cancel()
+    if _pending_saves:
+        # Fallback direct saves started while the drain task wasn't running
+        _, not_done = await asyncio.wait(set(_pending_saves), timeout=10)
+        if not_done:
+            logger.error(f"[Interview] {len(not_done)} direct response save(s) still running at shutdown")
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
 
+# Longest text /tts will synthesize in one request
+TTS_HTTP_MAX_CHARS = 2000
+
+
+async def require_bearer_token(authorization: Optional[str] = Header(None)) -> dict:
+    """Verify the Firebase ID token in "Authorization: Bearer <idToken>" (401 otherwise)."""
+    scheme, _, id_token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not id_token:
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    try:
+        decoded = lookup_cached_token(id_token)
+        if decoded is None:
+            decoded = await asyncio.to_thread(verify_id_token_cached, id_token)
+        return decoded
+    except Exception as e:
+        logger.warning(f"[HTTP] Invalid bearer token: {e}")
+        raise HTTPException(status_code=401, detail="Invalid idToken")
+
+
+@app.get("/tts")
+async def tts_wav(
+    text: str = Query(..., max_length=TTS_HTTP_MAX_CHARS),
+    _user: dict = Depends(require_bearer_token),
+):
+    """
+    Synthesize text and return raw audio/wav (no base64 expansion on the wire).
+    Arbitrary caller text isn't cached, so it can't evict interview prompts.
+    """
+    audio_bytes = await tts_text_to_wav_bytes_async(text, use_cache=False)
+    if audio_bytes is None:
+        raise HTTPException(status_code=503, detail="TTS unavailable")
+    return Response(content=audio_bytes, media_type="audio/wav")
+
+
+async def require_admin_token(user: dict = Depends(require_bearer_token)) -> dict:
+    """Like require_bearer_token, but the token must carry the "admin" custom claim (403 otherwise)."""
+    if user.get("admin") is not True:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return user
+
+
+@app.post("/admin/interviews/{interview_id}/invalidate")
+async def invalidate_interview_caches(interview_id: str, _admin: dict = Depends(require_admin_token)):
+    """Flush an interview's cached questions and RAG vectorstore after editing them."""
+    invalidate_interview_questions(interview_id)
+    await asyncio.to_thread(invalidate_vectorstore, interview_id)
+    logger.info("[Interview] Caches invalidated for interview %s", interview_id)
+    return {"status": "ok", "interviewId": interview_id}
+
+
+@app.get("/debug/tts-cache")
+async def tts_cache_stats(_user: dict = Depends(require_bearer_token)):
+    return tts_cache_info()
+
+
+# Outgoing wire formats, picked per connection from query params
+WIRE_JSON = "json"                # JSON text frames, audio as "audio_base64"
+WIRE_JSON_BINARY = "json+binary"  # JSON text frames, audio as a following binary frame
+WIRE_MSGPACK = "msgpack"          # MessagePack binary frames, audio as raw bytes in "audio"
+
+
+async def send_payload(websocket: WebSocket, payload: dict, wire_format: str):
+    """Send a payload as MessagePack (binary frame) or JSON (text frame)."""
+    if wire_format == WIRE_MSGPACK:
+        await websocket.send_bytes(msgpack_dumps(payload))
+    else:
+        await websocket.send_text(json_dumps(payload))
+
+
+async def send_with_audio(websocket: WebSocket, payload: dict, audio: Optional[bytes], wire_format: str):
+    """
+    Send a payload together with its TTS audio.
+    - WIRE_MSGPACK: raw WAV bytes in "audio" (None if TTS failed).
+    - WIRE_JSON_BINARY: JSON metadata frame ("audio_binary": true/false),
+      followed by the raw WAV bytes as a binary frame when audio is available.
+    - WIRE_JSON: audio embedded as "audio_base64" (None if TTS failed).
+    """
+    if wire_format == WIRE_MSGPACK:
+        payload["audio"] = audio
+    elif wire_format == WIRE_JSON_BINARY:
+        payload["audio_binary"] = audio is not None
+        await send_payload(websocket, payload, wire_format)
+        if audio is not None:
+            await websocket.send_bytes(audio)
+        return
+    else:
+        payload["audio_base64"] = b64encode_str(audio) if audio is not None else None
+    await send_payload(websocket, payload, wire_format)
+
+
+async def send_final_score_error(websocket: WebSocket, interview_id: str, error: str, wire_format: str):
+    """Terminal "final_score" frame without a score, so the client knows not to wait for one."""
+    try:
+        await send_payload(websocket, {"type": "final_score", "error": error, "interviewId": interview_id}, wire_format)
+    except Exception as e:
+        logger.warning(f"[WS] Could not send final score error: {e}")
+
+
+# Sentences of one streamed reply synthesized at once: enough to overlap TTS
+# with sending, without one long reply fanning out across every key
+STREAM_TTS_CONCURRENCY = 2
+
+
+async def stream_reply_with_tts(
+    websocket: WebSocket,
+    sentences: AsyncIterator[str],
+    base_payload: dict,
+    wire_format: str,
+) -> str:
+    """
+    Synthesize each streamed sentence as soon as it arrives and send it as
+    an "llm_partial" frame, in order. TTS for sentence n+1 runs while
+    sentence n is being sent; at most STREAM_TTS_CONCURRENCY syntheses are
+    in flight, later sentences wait their turn. If a send fails, the LLM
+    stream is closed, unsent TTS is cancelled and the send error is raised.
+    Returns the full reply text.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    tts_slots = asyncio.Semaphore(STREAM_TTS_CONCURRENCY)
+
+    async def _synthesize(sentence: str) -> Optional[bytes]:
+        async with tts_slots:
+            return await tts_text_to_wav_bytes_async(sentence)
+
+    async def _sender():
+        seq = 0
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            text, tts_task = item
+            audio = await tts_task
+            payload = {**base_payload, "type": "llm_partial", "text": text, "seq": seq}
+            await send_with_audio(websocket, payload, audio, wire_format)
+            seq += 1
+
+    sender_task = asyncio.create_task(_sender())
+    parts: List[str] = []
+    tts_tasks: List[asyncio.Task] = []
+    try:
+        async for sentence in sentences:
+            if sender_task.done():
+                # Sending failed (e.g. the client disconnected): stop pulling
+                # LLM output and starting TTS nobody will receive
+                break
+            parts.append(sentence)
+            tts_task = asyncio.create_task(_synthesize(sentence))
+            tts_tasks.append(tts_task)
+            queue.put_nowait((sentence, tts_task))
+    finally:
+        aclose = getattr(sentences, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        queue.put_nowait(None)
+        try:
+            # Re-raises the send error, if any
+            await sender_task
+        finally:
+            # Cancel TTS the sender never consumed (no-op when it sent everything)
+            for task in tts_tasks:
+                task.cancel()
+    return " ".join(parts)
+
+
 @app.websocket("/groqspeaks")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -51,68 +520,91 @@ async def websocket_endpoint(websocket: WebSocket):
     id_token = websocket.query_params.get("idToken")
     if not id_token:
         await websocket.close(code=4401)
-        print("[WS] Missing idToken, closing connection")
+        logger.warning("[WS] Missing idToken, closing connection")
         return
 
     # 2) Verify token with Firebase Admin SDK
     try:
-        decoded = firebase_auth.verify_id_token(id_token)
+        # Cache hits are answered inline; only misses go to the thread pool
+        decoded = lookup_cached_token(id_token)
+        if decoded is None:
+            decoded = await asyncio.to_thread(verify_id_token_cached, id_token)
         user_id = decoded["uid"]
-        print(f"[WS] Authenticated user: {user_id}")
+        logger.info("[WS] Authenticated user: %s", user_id)
     except Exception as e:
         await websocket.close(code=4401)
-        print(f"[WS] Invalid idToken: {e}")
+        logger.warning(f"[WS] Invalid idToken: {e}")
         return
 
+    # Optional outgoing framing:
+    # - format=msgpack: every payload is a MessagePack binary frame, audio as raw bytes
+    # - audioFormat=binary: JSON payloads, TTS audio as a separate binary frame
+    # Default is JSON with base64 audio.
+    wire_format = WIRE_JSON
+    if websocket.query_params.get("format") == "msgpack":
+        wire_format = WIRE_MSGPACK
+    elif websocket.query_params.get("audioFormat") == "binary":
+        wire_format = WIRE_JSON_BINARY
+
+    # Optional: replyStream=1 streams the interviewer reply sentence by sentence
+    # as "llm_partial" frames (each with its own audio and a "seq" number),
+    # followed by a closing "llm_response" frame with the full text.
+    stream_replies = websocket.query_params.get("replyStream") in ("1", "true")
+
+    # Optional: audioStream=1 lets the client stream an answer as several binary
+    # frames while recording, finished by {"type": "end_of_utterance"}. Without
+    # it, each binary frame is one complete answer.
+    stream_audio = websocket.query_params.get("audioStream") in ("1", "true")
+    utterance_buffer = bytearray()
+    # Set once an utterance passes MAX_UTTERANCE_BYTES; its remaining chunks are dropped
+    utterance_rejected = False
+
     # Optional: sessionId written by the frontend into users/{uid}/sessions/{sessionId}
     session_id = websocket.query_params.get("sessionId")
 
     # 3) Interview ID (can be provided by frontend or auto-generated)
     interview_id = websocket.query_params.get("interviewId") or str(uuid.uuid4())
 
-    # Get current attempt number for this interview
-    from firebase_client import db
-    try:
-        interview_doc = db.collection("interviews").document(interview_id).get()
-        current_attempt = 1
-        if interview_doc.exists:
-            data = interview_doc.to_dict() or {}
-            current_attempt = (data.get("attempt_count", 0) or 0) + 1
-    except Exception:
-        current_attempt = 1
-    print(f"[Interview] Starting attempt #{current_attempt} for interview {interview_id}")
+    # Per-connection nonce mixed into response doc IDs, so a repeated answer in
+    # a later session (same interview/attempt) doesn't overwrite an earlier one
+    session_nonce = uuid.uuid4().hex
+
+    # Attempt number: taken from the frontend if provided, otherwise looked up
+    # in the background so it doesn't delay question loading. It's only needed
+    # once the first answer is saved.
+    attempt_param = websocket.query_params.get("attempt")
+    if attempt_param and attempt_param.isdigit():
+        current_attempt = int(attempt_param)
+        attempt_task = None
+        logger.info("[Interview] Starting attempt #%s for interview %s", current_attempt, interview_id)
+    else:
+        current_attempt = None
+        attempt_task = asyncio.create_task(asyncio.to_thread(get_next_attempt_number, interview_id))
 
     # Load interview questions
-    questions = load_interview_questions(interview_id)
+    questions = await asyncio.to_thread(load_interview_questions, interview_id)
     if not questions:
         await websocket.send_text("No interview questions configured.")
         await websocket.close()
         return
 
-    # Build interview-specific vectorstore for RAG context
-    from rag import build_vectorstore_from_firestore
-    try:
-        print(f"[Interview] Building RAG vectorstore for interview {interview_id}")
-        interview_vectorstore = build_vectorstore_from_firestore(interview_id)
-        if interview_vectorstore:
-            interview_retriever = interview_vectorstore.as_retriever(search_kwargs={"k": 4})
-            print(f"[Interview] RAG vectorstore ready for {interview_id}")
-        else:
-            interview_retriever = None
-            print(f"[Interview] No RAG context found for {interview_id}")
-    except Exception as e:
-        print(f"[Interview] Error building vectorstore: {e}")
-        interview_retriever = None
+    # Build the interview-specific RAG retriever in the background; it is only
+    # needed for the first LLM call, so it overlaps with the greeting TTS.
+    retriever_task = asyncio.create_task(asyncio.to_thread(build_interview_retriever, interview_id))
+    interview_retriever = None
 
     current_q_index = 0
 
-    # Chat history for LLM context
-    chat_hist = [
-        {
-            "role": "system",
-            "content": "Interviewer AI session started.",
-        }
-    ]
+    # Per-connection state: chat history for LLM context + metrics per question
+    state = SessionState(
+        chat_hist=[
+            {
+                "role": "system",
+                "content": "Interviewer AI session started.",
+            }
+        ],
+        metrics=[None] * len(questions),
+    )
 
     # ---- Send initial greeting + first question ----
     first_question = questions[current_q_index]
@@ -121,26 +613,22 @@ async def websocket_endpoint(websocket: WebSocket):
         "We will proceed through the questions one by one.\n\n"
         f"Your first question is: {first_question}"
     )
-    intro_audio_base64 = tts_text_to_base64_wav(intro_text)
+    intro_audio = await tts_text_to_wav_bytes_async(intro_text)
 
     initial_payload = {
         "text": intro_text,
-        "audio_base64": intro_audio_base64,
         "interviewId": interview_id,
         "questionIndex": current_q_index,
     }
-    await websocket.send_text(json.dumps(initial_payload))
-    chat_hist.append({"role": "assistant", "content": intro_text})
-
-    metrics_buffer = {}
-    metrics_by_question = {}
+    await send_with_audio(websocket, initial_payload, intro_audio, wire_format)
+    state.add_message("assistant", intro_text)
 
     try:
         while True:
             try:
                 message = await websocket.receive()
             except Exception as e:
-                print(f"[WS] Error receiving message: {e}")
+                logger.error(f"[WS] Error receiving message: {e}")
                 break
 
             if message.get("type") == "websocket.disconnect":
@@ -151,82 +639,128 @@ async def websocket_endpoint(websocket: WebSocket):
 
             if text_data is not None:
                 try:
-                    payload = json.loads(text_data)
+                    payload = json_loads(text_data)
                 except Exception:
                     continue
 
                 if payload.get("type") == "metrics":
                     q_idx = int(payload.get("questionIndex", current_q_index))
                     received_metrics = payload.get("metrics", {})
-                    metrics_buffer[q_idx] = received_metrics
-                    print(f"[Metrics] Received metrics for Q{q_idx}: {received_metrics}")
-                continue
+                    if 0 <= q_idx < len(state.metrics):
+                        state.metrics[q_idx] = received_metrics
+                        logger.debug("[Metrics] Received metrics for Q%s: %s", q_idx, received_metrics)
+                    continue
 
-            if bytes_data is None:
+                if not (stream_audio and payload.get("type") == "end_of_utterance"):
+                    continue
+                if utterance_rejected:
+                    utterance_rejected = False
+                    continue
+                if not utterance_buffer:
+                    continue
+                # Streamed answer complete: transcribe everything received so far
+                audio_bytes = bytes(utterance_buffer)
+                utterance_buffer.clear()
+            elif bytes_data is None:
                 continue
+            elif stream_audio:
+                # Chunks are uploaded while the candidate is still speaking
+                if utterance_rejected:
+                    continue
+                if len(utterance_buffer) + len(bytes_data) > MAX_UTTERANCE_BYTES:
+                    logger.warning(f"[WS] Streamed answer exceeded {MAX_UTTERANCE_BYTES} bytes; rejecting it")
+                    utterance_buffer.clear()
+                    utterance_rejected = True
+                    try:
+                        await send_payload(websocket, {"text": "Answer too long; please try again."}, wire_format)
+                    except Exception:
+                        pass
+                    continue
+                utterance_buffer.extend(bytes_data)
+                continue
+            else:
+                audio_bytes = bytes_data
 
-            audio_bytes = bytes_data
-
-            # Persist to a temp file for the STT client (some clients accept file path)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_audio:
-                temp_audio.write(audio_bytes)
-                temp_audio_path = temp_audio.name
-
-            try:
-                with open(temp_audio_path, "rb") as f:
-                    t0 = time.monotonic()
-                    resp = client_stt.audio.transcriptions.create(
-                        file=(temp_audio_path, f.read()),
-                        model="whisper-large-v3-turbo",
-                        response_format="verbose_json",
-                    )
-                    t1 = time.monotonic()
-                    print(f"[STT] Transcription took {t1 - t0:.2f}s")
-                user_text = getattr(resp, "text", "") or ""
-            except Exception as e:
-                print(f"[STT] Transcription error: {e}")
-                user_text = ""
-            finally:
-                try:
-                    os.remove(temp_audio_path)
-                except Exception:
-                    pass
+            # Send the audio straight from memory; no temp file round-trip
+            t0 = time.monotonic()
+            user_text = await asyncio.to_thread(transcribe_audio, audio_bytes)
+            t1 = time.monotonic()
+            logger.info("[STT] Transcription took %.2fs", t1 - t0)
 
             # If transcript empty, inform client and continue waiting for next audio
             if not user_text:
                 try:
-                    await websocket.send_text(json.dumps({"text": "Transcription empty or failed."}))
+                    await send_payload(websocket, {"text": "Transcription empty or failed."}, wire_format)
                 except Exception:
                     pass
                 continue
 
             # Prepare metrics (frontend-sent only; filler counts removed)
-            frontend_metrics = metrics_buffer.pop(current_q_index, {})
-            merged_metrics = {**frontend_metrics}
-            metrics_by_question[current_q_index] = merged_metrics
-            print(f"[Metrics] Using metrics for Q{current_q_index}: {merged_metrics}")
+            merged_metrics = state.metrics[current_q_index] or {}
+            state.metrics[current_q_index] = merged_metrics
+            logger.debug("[Metrics] Using metrics for Q%s: %s", current_q_index, merged_metrics)
+
+            # History for this turn's prompt; the answer itself goes in the turn message
+            reply_history = list(state.recent_messages)
+            reply_summary = list(state.summary_lines)
 
             # Append to chat history and persist
-            chat_hist.append({"role": "user", "content": user_text})
+            state.add_message("user", user_text)
             current_question_text = questions[current_q_index]
 
+            # Determine next question (if any)
+            if current_q_index < len(questions) - 1:
+                next_question = questions[current_q_index + 1]
+            else:
+                next_question = None
+
+            if retriever_task is not None:
+                interview_retriever = await retriever_task
+                retriever_task = None
+
+            reply_kwargs = dict(
+                user_answer=user_text,
+                chat_hist=None,
+                history_messages=reply_history,
+                history_summary=reply_summary,
+                current_question=current_question_text,
+                next_question=next_question,
+                metrics=merged_metrics,
+                retriever=interview_retriever,
+            )
+
+            # Start the LLM right away; the transcript echo and the response
+            # write below run while it generates. Streamed replies start later,
+            # since their sentences are sent as soon as they are synthesized.
+            t0_llm = time.monotonic()
+            llm_task = None
+            if not stream_replies:
+                llm_task = asyncio.create_task(
+                    asyncio.to_thread(generate_interviewer_reply, **reply_kwargs)
+                )
+
             # Send transcript + metrics back to client
             try:
-                await websocket.send_text(
-                    json.dumps(
-                        {
-                            "type": "transcript",
-                            "interviewId": interview_id,
-                            "questionIndex": current_q_index,
-                            "transcript": user_text,
-                            "metrics": merged_metrics,
-                        }
-                    )
+                await send_payload(
+                    websocket,
+                    {
+                        "type": "transcript",
+                        "interviewId": interview_id,
+                        "questionIndex": current_q_index,
+                        "transcript": user_text,
+                        "metrics": merged_metrics,
+                    },
+                    wire_format,
                 )
             except Exception:
                 pass
 
-            save_user_response(
+            if current_attempt is None:
+                current_attempt = await attempt_task
+                logger.info("[Interview] Attempt #%s for interview %s", current_attempt, interview_id)
+
+            # Persist in the background; the LLM call doesn't depend on it
+            response_write = dict(
                 interview_id=interview_id,
                 user_id=user_id,
                 question_index=current_q_index,
@@ -234,63 +768,75 @@ async def websocket_endpoint(websocket: WebSocket):
                 answer_text=user_text,
                 metrics=merged_metrics,
                 attempt_number=current_attempt,
+                session_nonce=session_nonce,
             )
-
-            # Determine next question (if any)
-            if current_q_index < len(questions) - 1:
-                next_question = questions[current_q_index + 1]
-            else:
-                next_question = None
+            if not enqueue_user_response(**response_write):
+                save_task = asyncio.create_task(asyncio.to_thread(save_user_response, **response_write))
+                _pending_saves.add(save_task)
+                save_task.add_done_callback(_pending_saves.discard)
 
             try:
-                t0_llm = time.monotonic()
-                res = generate_interviewer_reply(
-                    user_answer=user_text,
-                    chat_hist=chat_hist,
-                    current_question=current_question_text,
-                    next_question=next_question,
-                    metrics=merged_metrics,
-                    retriever=interview_retriever,
-                )
-                t1_llm = time.monotonic()
-                print(f"[WS] LLM produced response (took {t1_llm - t0_llm:.2f}s): {res[:200]}")
-                chat_hist.append({"role": "assistant", "content": res})
-
-                t0_tts = time.monotonic()
-                audio_base64 = tts_text_to_base64_wav(res)
-                t1_tts = time.monotonic()
-                print(f"[TTS] Synthesis took {t1_tts - t0_tts:.2f}s")
-                
                 response_payload = {
                     "type": "llm_response",
-                    "text": res,
                     "interviewId": interview_id,
                     "questionIndex": current_q_index,
                 }
-                
-                if audio_base64 is None:
-                    print("[TTS] All TTS models failed, sending text-only response")
-                    response_payload["audio_base64"] = None
+
+                if stream_replies:
+                    res = await stream_reply_with_tts(
+                        websocket,
+                        astream_interviewer_sentences(**reply_kwargs),
+                        response_payload,
+                        wire_format,
+                    )
+                    t1_llm = time.monotonic()
+                    logger.info("[WS] Streamed LLM response (took %.2fs): %s", t1_llm - t0_llm, res[:200])
+                    state.add_message("assistant", res)
+
+                    # Closing frame: full text, audio already sent as llm_partial frames
+                    response_payload["text"] = res
+                    response_payload["streamed"] = True
+                    await send_payload(websocket, response_payload, wire_format)
                 else:
-                    response_payload["audio_base64"] = audio_base64
-                
-                await websocket.send_text(json.dumps(response_payload))
+                    res = await llm_task
+                    t1_llm = time.monotonic()
+                    logger.info("[WS] LLM produced response (took %.2fs): %s", t1_llm - t0_llm, res[:200])
+                    state.add_message("assistant", res)
+
+                    t0_tts = time.monotonic()
+                    audio_bytes = await tts_text_to_wav_bytes_async(res)
+                    t1_tts = time.monotonic()
+                    logger.info("[TTS] Synthesis took %.2fs", t1_tts - t0_tts)
+
+                    response_payload["text"] = res
+
+                    if audio_bytes is None:
+                        logger.warning("[TTS] All TTS models failed, sending text-only response")
+
+                    await send_with_audio(websocket, response_payload, audio_bytes, wire_format)
 
                 # If that was the last question, generate and store final score
                 if next_question is None:
                     try:
-                        print(f"[Interview] Generating final score for interview {interview_id}")
-                        score_result = generate_final_score(
-                            chat_hist,
-                            questions,
-                            metrics_by_question,
-                            user_id=user_id,
-                            session_id=session_id,
+                        logger.info("[Interview] Generating final score for interview %s", interview_id)
+                        score_result = await asyncio.wait_for(
+                            asyncio.to_thread(
+                                get_or_generate_final_score,
+                                interview_id,
+                                state.chat_hist,
+                                questions,
+                                state.metrics_by_question(current_q_index),
+                                user_id=user_id,
+                                session_id=session_id,
+                                history_str="\n".join(state.history_lines),
+                            ),
+                            timeout=FINAL_SCORE_TIMEOUT_SECONDS,
                         )
                         score = score_result["score"]
                         justification = score_result["justification"]
 
-                        attempt_count = save_interview_score(
+                        attempt_count = await asyncio.to_thread(
+                            save_interview_score,
                             interview_id=interview_id,
                             user_id=user_id,
                             score=score,
@@ -304,11 +850,19 @@ async def websocket_endpoint(websocket: WebSocket):
                             "interviewId": interview_id,
                             "attempt_count": attempt_count,
                         }
-                        await websocket.send_text(json.dumps(final_payload))
+                        await send_payload(websocket, final_payload, wire_format)
+                    except asyncio.TimeoutError:
+                        # wait_for can't stop the worker thread: scoring still
+                        # finishes in the background and fills the score cache,
+                        # so a reconnect replaying the same answers reuses it.
+                        # The attempt isn't recorded by save_interview_score.
+                        logger.error(f"[Interview] Final score timed out after {FINAL_SCORE_TIMEOUT_SECONDS}s for interview {interview_id}")
+                        await send_final_score_error(websocket, interview_id, "timeout", wire_format)
                     except Exception as e:
-                        print(f"[Interview] Error generating/saving score: {e}")
+                        logger.error(f"[Interview] Error generating/saving score: {e}")
+                        await send_final_score_error(websocket, interview_id, "failed", wire_format)
 
-                    print(f"[Interview] Completed interview {interview_id} for user {user_id}")
+                    logger.info("[Interview] Completed interview %s for user %s", interview_id, user_id)
                     await websocket.close()
                     break
 
@@ -318,15 +872,25 @@ async def websocket_endpoint(websocket: WebSocket):
             except Exception as e:
                 err_msg = f"Error: {str(e)}"
                 try:
-                    await websocket.send_text(json.dumps({"text": err_msg}))
+                    await send_payload(websocket, {"text": err_msg}, wire_format)
                 except Exception:
                     pass
 
     except WebSocketDisconnect:
-        chat_hist = []
-        print("WebSocket got disconnected")
+        state.chat_hist = []
+        logger.info("WebSocket got disconnected")
 
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 7860))
-    uvicorn.run("main:app", host="127.0.0.1", port=port)
+    uvicorn.run(
+        "main:app",
+        host="127.0.0.1",
+        port=port,
+        # C event loop / HTTP parser from uvicorn[standard]
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        # Each worker holds its own embedding model and caches
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1")),
+    )
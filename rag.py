@@ -1,28 +1,221 @@
 import os
 os.environ["TRANSFORMERS_NO_TF"] = "1"
 
-from typing import List, Dict, Any, Optional
+import asyncio
+import re
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+import groq
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_groq import ChatGroq
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
 from langchain_huggingface import HuggingFaceEmbeddings
-from pydantic import SecretStr
+from pydantic import BaseModel, Field, SecretStr
 
 
 from config import (
+    CHAT_HISTORY_TURNS,
     INTERVIEW_CONTEXT_COLLECTION,
     NON_EMPTY_GROQ_KEYS,
+    SCORE_CACHE_TTL_SECONDS,
+    VECTORSTORE_CACHE_TTL_SECONDS,
+    VECTORSTORE_CACHE_MAXSIZE,
+    VECTORSTORE_CACHE_DIR,
+    VECTORSTORE_HNSW_MIN_DOCS,
+    EMBEDDINGS_BACKEND,
+    EMBEDDINGS_CT2_MODEL_DIR,
+    LLM_KEY_COOLDOWN_SECONDS,
 )
-from firebase_client import db, get_session_with_events
+from http_clients import groq_http_client, groq_async_http_client
+from firebase_client import db, get_session_with_events, load_cached_score, save_cached_score
 import datetime
+import hashlib
+import itertools
+import json
+import logging
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 # ---- Embeddings + Vector store ----
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Documents are encoded in large batches; normalized vectors make FAISS L2
+# ranking match the cosine similarity MiniLM is trained for
+_EMBEDDING_ENCODE_KWARGS = {"batch_size": 64, "normalize_embeddings": True}
+
+
+class CT2MiniLMEmbeddings(Embeddings):
+    """MiniLM on a CTranslate2 int8 encoder: mean-pooled, L2-normalized like sentence-transformers."""
+
+    def __init__(self, model_dir: str, batch_size: int = 64, max_length: int = 256):
+        import ctranslate2
+        from transformers import AutoTokenizer
+
+        self._encoder = ctranslate2.Encoder(model_dir, device="cpu", compute_type="int8")
+        self._tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+        self._batch_size = batch_size
+        self._max_length = max_length
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self._batch_size):
+            batch = texts[start:start + self._batch_size]
+            ids = self._tokenizer(batch, truncation=True, max_length=self._max_length)["input_ids"]
+            tokens = [self._tokenizer.convert_ids_to_tokens(row) for row in ids]
+            hidden = np.array(self._encoder.forward_batch(tokens).last_hidden_state)
+            # Mean over each sequence's real tokens (the batch is padded to the longest)
+            mask = np.zeros(hidden.shape[:2], dtype=np.float32)
+            for row, seq in enumerate(tokens):
+                mask[row, :len(seq)] = 1.0
+            pooled = (hidden * mask[:, :, None]).sum(axis=1) / mask.sum(axis=1, keepdims=True)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+
+def _load_embedding_model() -> Embeddings:
+    """Load MiniLM on EMBEDDINGS_BACKEND (ONNX Runtime by default), falling back to PyTorch."""
+    if EMBEDDINGS_BACKEND == "ctranslate2":
+        try:
+            return CT2MiniLMEmbeddings(EMBEDDINGS_CT2_MODEL_DIR)
+        except Exception as e:
+            logger.warning(f"[RAG] CTranslate2 model '{EMBEDDINGS_CT2_MODEL_DIR}' unavailable, using torch: {e}")
+    elif EMBEDDINGS_BACKEND != "torch":
+        try:
+            return HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL_NAME,
+                model_kwargs={"backend": EMBEDDINGS_BACKEND},
+                encode_kwargs=_EMBEDDING_ENCODE_KWARGS,
+            )
+        except Exception as e:
+            logger.warning(f"[RAG] Embeddings backend '{EMBEDDINGS_BACKEND}' unavailable, using torch: {e}")
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        encode_kwargs=_EMBEDDING_ENCODE_KWARGS,
+    )
+
+
+embedding_model = _load_embedding_model()
+
+
+# Only the fields the vectorstore needs are pulled from Firestore
+_CONTEXT_FIELDS = ["content", "text", "interviewId", "topic"]
+
+# interview_id ("" = all context) -> (built_at, FAISS)
+_vectorstore_cache: Dict[str, Tuple[float, FAISS]] = {}
+_vectorstore_cache_lock = threading.Lock()
+
+
+def invalidate_vectorstore(interview_id: Optional[str] = None):
+    """
+    Drop the cached vectorstore for one interview (or all when interview_id
+    is None), in memory and in VECTORSTORE_CACHE_DIR, so the next build
+    re-reads Firestore.
+    """
+    with _vectorstore_cache_lock:
+        if interview_id is None:
+            _vectorstore_cache.clear()
+        else:
+            _vectorstore_cache.pop(interview_id, None)
+    if not VECTORSTORE_CACHE_DIR:
+        return
+    if interview_id is None:
+        try:
+            folders = [
+                os.path.join(VECTORSTORE_CACHE_DIR, name)
+                for name in os.listdir(VECTORSTORE_CACHE_DIR) if name.startswith("vs_")
+            ]
+        except FileNotFoundError:
+            folders = []
+    else:
+        folders = [_vectorstore_dir(interview_id)]
+    for folder in folders:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _vectorstore_dir(cache_key: str) -> Optional[str]:
+    if not VECTORSTORE_CACHE_DIR:
+        return None
+    # Indexes built by another embeddings backend aren't interchangeable
+    digest = hashlib.sha1(f"{EMBEDDINGS_BACKEND}:{cache_key}".encode("utf-8")).hexdigest()
+    return os.path.join(VECTORSTORE_CACHE_DIR, f"vs_{digest}")
+
+
+def _load_vectorstore_from_disk(cache_key: str) -> Optional[FAISS]:
+    folder = _vectorstore_dir(cache_key)
+    if not folder:
+        return None
+    # save_local rewrites the files in place, which leaves the folder's own mtime untouched
+    index_path = os.path.join(folder, "index.faiss")
+    if not os.path.isfile(index_path):
+        return None
+    if time.time() - os.path.getmtime(index_path) >= VECTORSTORE_CACHE_TTL_SECONDS:
+        return None
+    try:
+        # Files are written by _save_vectorstore_to_disk below, never user supplied
+        return FAISS.load_local(folder, embedding_model, allow_dangerous_deserialization=True)
+    except Exception as e:
+        logger.warning(f"[RAG] Failed to load cached vectorstore from {folder}: {e}")
+        return None
+
+
+def _save_vectorstore_to_disk(cache_key: str, vectorstore: FAISS):
+    folder = _vectorstore_dir(cache_key)
+    if not folder:
+        return
+    try:
+        vectorstore.save_local(folder)
+    except Exception as e:
+        logger.warning(f"[RAG] Failed to persist vectorstore to {folder}: {e}")
 
 
 def build_vectorstore_from_firestore(interview_id: Optional[str] = None) -> Optional[FAISS]:
+    """
+    Return the FAISS vector store for an interview, reusing a cached one
+    (in memory, then VECTORSTORE_CACHE_DIR on disk) while it is fresh.
+    Otherwise builds it from Firestore (see _build_vectorstore).
+    """
+    cache_key = interview_id or ""
+    now = time.monotonic()
+    with _vectorstore_cache_lock:
+        cached = _vectorstore_cache.get(cache_key)
+        if cached and now - cached[0] < VECTORSTORE_CACHE_TTL_SECONDS:
+            logger.debug("[RAG] Using cached vectorstore for interview %s", interview_id or "all")
+            return cached[1]
+
+    vectorstore = _load_vectorstore_from_disk(cache_key)
+    if vectorstore is not None:
+        logger.info("[RAG] Loaded cached vectorstore from disk for interview %s", interview_id or "all")
+    else:
+        vectorstore = _build_vectorstore(interview_id)
+        if vectorstore is None:
+            return None
+        _save_vectorstore_to_disk(cache_key, vectorstore)
+
+    with _vectorstore_cache_lock:
+        if len(_vectorstore_cache) >= VECTORSTORE_CACHE_MAXSIZE:
+            # Evict the oldest entry
+            oldest = min(_vectorstore_cache, key=lambda k: _vectorstore_cache[k][0])
+            _vectorstore_cache.pop(oldest, None)
+        _vectorstore_cache[cache_key] = (now, vectorstore)
+    return vectorstore
+
+
+def _build_vectorstore(interview_id: Optional[str] = None) -> Optional[FAISS]:
     """
     Pulls documents from Firestore and builds a FAISS vector store.
     If interview_id is provided, filters to that interview's context only.
@@ -36,12 +229,12 @@ def build_vectorstore_from_firestore(interview_id: Optional[str] = None) -> Opti
     if interview_id:
         # Filter by interview_id
         query = collection_ref.where("interviewId", "==", interview_id)
-        docs_to_process = list(query.stream())
-        print(f"[RAG] Loading context for interview {interview_id}...")
+        logger.info("[RAG] Loading context for interview %s...", interview_id)
     else:
         # Load all (fallback)
-        docs_to_process = list(collection_ref.stream())
-        print(f"[RAG] Loading all context (no interview_id filter)...")
+        query = collection_ref
+        logger.info("[RAG] Loading all context (no interview_id filter)...")
+    docs_to_process = query.select(_CONTEXT_FIELDS).stream()
 
     for doc_snap in docs_to_process:
         data = doc_snap.to_dict() or {}
@@ -56,10 +249,12 @@ def build_vectorstore_from_firestore(interview_id: Optional[str] = None) -> Opti
         metadatas.append(meta)
 
     if not texts:
-        print(f"[RAG] No documents found for interview {interview_id or 'all'} in collection: {INTERVIEW_CONTEXT_COLLECTION}")
+        logger.info("[RAG] No documents found for interview %s in collection: %s", interview_id or "all", INTERVIEW_CONTEXT_COLLECTION)
         return None
 
-    print(f"[RAG] Loaded {len(texts)} context docs for interview {interview_id or 'all'}.")
+    logger.info("[RAG] Loaded %s context docs for interview %s.", len(texts), interview_id or "all")
+    if len(texts) >= VECTORSTORE_HNSW_MIN_DOCS:
+        return _build_hnsw_vectorstore(texts, metadatas)
     vectorstore = FAISS.from_texts(
         texts=texts,
         embedding=embedding_model,
@@ -67,6 +262,35 @@ def build_vectorstore_from_firestore(interview_id: Optional[str] = None) -> Opti
     )
     return vectorstore
 
+
+# HNSW graph degree and search breadth; vectors are normalized, so L2 ranks like cosine
+_HNSW_M = 32
+_HNSW_EF_SEARCH = 64
+
+
+def _build_hnsw_vectorstore(texts: List[str], metadatas: List[Dict[str, Any]]) -> FAISS:
+    """Build a LangChain FAISS store backed by an IndexHNSWFlat instead of a flat index."""
+    import faiss
+    import numpy as np
+
+    vectors = np.asarray(embedding_model.embed_documents(texts), dtype="float32")
+    index = faiss.IndexHNSWFlat(vectors.shape[1], _HNSW_M)
+    index.hnsw.efSearch = _HNSW_EF_SEARCH
+    index.add(vectors)
+
+    doc_ids = [str(i) for i in range(len(texts))]
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=text, metadata=meta)
+        for doc_id, text, meta in zip(doc_ids, texts, metadatas)
+    })
+    logger.info("[RAG] Built HNSW index over %s context docs", len(texts))
+    return FAISS(
+        embedding_function=embedding_model,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(doc_ids)),
+    )
+
 # Vectorstore will be built per-interview in the websocket endpoint
 vectorstore = None
 retriever = None
@@ -81,48 +305,113 @@ llm_clients = [
         model="llama-3.3-70b-versatile",
         temperature=0.3,
         api_key=SecretStr(k),
+        # Shared keep-alive pools instead of a new client (and TLS session) per key
+        http_client=groq_http_client,
+        http_async_client=groq_async_http_client,
     )
     for k in NON_EMPTY_GROQ_KEYS
 ]
 
+# Each call starts at the next key; keys in cooldown are only tried last
+_llm_rotation = itertools.count()
+# client index -> monotonic time its cooldown ends
+_llm_penalty: Dict[int, float] = {}
+_llm_penalty_lock = threading.Lock()
+
+
+def _llm_clients_in_order() -> List[Tuple[int, ChatGroq]]:
+    """Round-robin over llm_clients, healthy keys first, cooling-down keys after."""
+    n = len(llm_clients)
+    start = next(_llm_rotation) % n
+    now = time.monotonic()
+    with _llm_penalty_lock:
+        cooling = {i for i, until in _llm_penalty.items() if until > now}
+    order = [(start + k) % n for k in range(n)]
+    ranked = [i for i in order if i not in cooling] + [i for i in order if i in cooling]
+    return [(i, llm_clients[i]) for i in ranked]
+
+
+# Connection failures and timeouts (groq.APITimeoutError subclasses APIConnectionError)
+_LLM_TRANSPORT_ERRORS = (groq.APIConnectionError, httpx.TransportError)
+
+
+def _penalize_llm_client(index: int, exc: Exception):
+    """Put a key in cooldown on 429 / 5xx / connection errors; other errors aren't key-specific."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is None:
+        if not isinstance(exc, _LLM_TRANSPORT_ERRORS):
+            return
+    elif status != 429 and status < 500:
+        return
+    with _llm_penalty_lock:
+        _llm_penalty[index] = time.monotonic() + LLM_KEY_COOLDOWN_SECONDS
+
+
+def _clear_llm_penalty(index: int):
+    if index in _llm_penalty:
+        with _llm_penalty_lock:
+            _llm_penalty.pop(index, None)
+
 # ---- Prompt helpers ----
 
+def format_history_line(role: Optional[str], content: str) -> Optional[str]:
+    """One transcript line for a stored message (None for system/unknown roles)."""
+    if role == "user":
+        return f"Candidate: {content}"
+    if role == "assistant":
+        return f"Interviewer: {content}"
+    return None
+
+
+# Words of each older candidate answer kept in the rolling prompt summary
+_SUMMARY_ANSWER_WORDS = 25
+
+
+def summarize_answer(number: int, content: str) -> str:
+    """One-line summary of an older candidate answer for the prompt."""
+    words = content.split()
+    text = " ".join(words[:_SUMMARY_ANSWER_WORDS])
+    if len(words) > _SUMMARY_ANSWER_WORDS:
+        text += " ..."
+    return f"Answer {number}: {text}"
+
+
 def format_history(chat_hist: List[Dict[str, str]]) -> str:
     """Convert stored history into a plain-text conversation summary for the prompt."""
     lines: List[str] = []
     for msg in chat_hist:
-        role = msg.get("role")
-        content = msg.get("content", "")
-        if role == "user":
-            lines.append(f"Candidate: {content}")
-        elif role == "assistant":
-            lines.append(f"Interviewer: {content}")
+        line = format_history_line(msg.get("role"), msg.get("content", ""))
+        if line is not None:
+            lines.append(line)
     return "\n".join(lines)
 
+# Filler-sound cleanup, compiled once (runs on every reply / streamed sentence).
+# Remove only exact filler sounds and common interjections;
+# be conservative to avoid removing legitimate words
+_FILLER_RES = (
+    # Exact filler sounds as whole words
+    re.compile(r'\b(um|umm|ummm|uh|uhh|uhhh|ah|ahh|ahhh|hmm|hm|err|errr|er)\b', re.IGNORECASE),
+    # Trailing punctuation with fillers
+    re.compile(r',\s*(?=\b(?:um|uh|ah|hmm|err)\b)', re.IGNORECASE),
+)
+_MULTI_SPACE_RE = re.compile(r'\s+')
+_DOUBLE_COMMA_RE = re.compile(r',\s*,')
+_SPACE_BEFORE_PUNCT_RE = re.compile(r'\s+([,.])')
+
+
 def clean_filler_sounds(text: str) -> str:
     """Remove filler sounds and interjections from AI response."""
-    import re
-    
-    # Remove only exact filler sounds and common interjections
-    # Be conservative to avoid removing legitimate words
-    fillers = [
-        # Exact filler sounds as whole words
-        r'\b(um|umm|ummm|uh|uhh|uhhh|ah|ahh|ahhh|hmm|hm|err|errr|er)\b',
-        # Trailing punctuation with fillers
-        r',\s*(?=\b(?:um|uh|ah|hmm|err)\b)',
-    ]
-    
     result = text
-    for filler in fillers:
-        result = re.sub(filler, '', result, flags=re.IGNORECASE)
-    
+    for filler in _FILLER_RES:
+        result = filler.sub('', result)
+
     # Clean up multiple spaces, commas, and punctuation that result from removals
-    result = re.sub(r'\s+', ' ', result)  # Multiple spaces → single space
-    result = re.sub(r',\s*,', ',', result)  # Double commas
-    result = re.sub(r'\s+([,.])', r'\1', result)  # Space before punctuation
-    result = re.sub(r'^\s+|\s+$', '', result)  # Leading/trailing whitespace
-    
-    return result
+    result = _MULTI_SPACE_RE.sub(' ', result)  # Multiple spaces → single space
+    result = _DOUBLE_COMMA_RE.sub(',', result)  # Double commas
+    result = _SPACE_BEFORE_PUNCT_RE.sub(r'\1', result)  # Space before punctuation
+    return result.strip()  # Leading/trailing whitespace
 
 
 def format_metrics(metrics: Optional[Dict[str, Any]]) -> str:
@@ -168,7 +457,9 @@ def format_metrics(metrics: Optional[Dict[str, Any]]) -> str:
     return "; ".join(parts) if parts else "Audio captured successfully"
 
 
-INTERVIEWER_PROMPT_TEMPLATE = """
+# Static rules, sent as the system message on every turn. Being identical
+# across requests lets Groq reuse its prompt cache for this prefix.
+INTERVIEWER_SYSTEM_PROMPT = """
 You are a professional AI interviewer conducting a live job interview. Your tone must be formal, polite, calm, and encouraging — not robotic or harsh.
 
 You must strictly follow these rules:
@@ -189,15 +480,26 @@ You must strictly follow these rules:
   Then say something like:
   "All questions have been asked and the interview is over."
 
-Use the following job-related context if it is relevant:
+The earlier messages are the most recent conversation (candidate answers and your replies); older candidate answers may be summarized before them.
+The last message gives the current turn. Produce your response in plain text, strictly following all the rules above.
+""".strip()
+
+# Per-turn input, sent as the final human message (an f-string, so no
+# .format() template parsing per turn)
+def build_turn_message(
+    context: str,
+    current_question: str,
+    user_answer: str,
+    audio_metrics: str,
+    next_question: str,
+    is_last_question: str,
+) -> str:
+    return f"""Use the following job-related context if it is relevant:
 
 <context>
 {context}
 </context>
 
-Conversation so far:
-{history}
-
 Current question the candidate just answered:
 {current_question}
 
@@ -210,24 +512,48 @@ Audio delivery metrics (use prominently in your feedback):
 Next question (if any):
 {next_question}
 
-Is this the last question? {is_last_question}
+Is this the last question? {is_last_question}"""
 
-Now produce your response in plain text, strictly following all the rules above.
-"""
 
+_INTERVIEWER_SYSTEM_MESSAGE = SystemMessage(content=INTERVIEWER_SYSTEM_PROMPT)
 
 
+def history_message(role: Optional[str], content: str) -> Optional[BaseMessage]:
+    """Chat message for a stored message: candidate → Human, interviewer → AI (None otherwise)."""
+    if role == "user":
+        return HumanMessage(content=content)
+    if role == "assistant":
+        return AIMessage(content=content)
+    return None
 
-def generate_interviewer_reply(
+
+def history_to_messages(chat_hist: List[Dict[str, str]]) -> List[BaseMessage]:
+    """Map stored history to chat messages."""
+    messages: List[BaseMessage] = []
+    for msg in chat_hist:
+        m = history_message(msg.get("role"), msg.get("content", ""))
+        if m is not None:
+            messages.append(m)
+    return messages
+
+
+def build_interviewer_prompt(
     user_answer: str,
-    chat_hist: List[Dict[str, str]],
+    chat_hist: Optional[List[Dict[str, str]]],
     current_question: str,
     next_question: Optional[str],
     metrics: Optional[Dict[str, Any]] = None,
     retriever: Optional[Any] = None,
-) -> str:
-    """Use LangChain + Groq + Firestore-backed RAG to review the answer and ask next question / end interview."""
-    history_str = format_history(chat_hist)
+    history_messages: Optional[List[BaseMessage]] = None,
+    history_summary: Optional[List[str]] = None,
+) -> List[BaseMessage]:
+    """
+    Build the chat messages for one interviewer turn: the static system
+    prompt, a summary of older answers, the last CHAT_HISTORY_TURNS turn
+    pairs, then the current turn (with RAG context from the retriever if given).
+    Callers that keep prebuilt history_messages / history_summary (excluding
+    the current answer) can pass those instead of chat_hist to skip the conversion.
+    """
     metrics_str = format_metrics(metrics)
 
     # Build RAG context from current question + answer
@@ -238,42 +564,167 @@ def generate_interviewer_reply(
             docs = retriever.invoke(query)
             context_text = "\n\n".join(d.page_content for d in docs)
         except Exception as e:
-            print(f"[RAG] Error retrieving context: {e}")
+            logger.error(f"[RAG] Error retrieving context: {e}")
             context_text = ""
 
-    prompt = INTERVIEWER_PROMPT_TEMPLATE.format(
+    if history_messages is None:
+        # The current answer is part of the turn message; don't repeat it as history
+        history = chat_hist or []
+        if history and history[-1].get("role") == "user" and history[-1].get("content") == user_answer:
+            history = history[:-1]
+        recent = history[-2 * CHAT_HISTORY_TURNS:] if CHAT_HISTORY_TURNS > 0 else []
+        older = history[:len(history) - len(recent)]
+        history_summary = [
+            summarize_answer(n, msg.get("content", ""))
+            for n, msg in enumerate((m for m in older if m.get("role") == "user"), start=1)
+        ]
+        history_messages = history_to_messages(recent)
+
+    turn = build_turn_message(
         context=context_text,
-        history=history_str,
         current_question=current_question,
         user_answer=user_answer,
         audio_metrics=metrics_str,
         next_question=next_question or "",
         is_last_question="yes" if next_question is None else "no",
     )
+    messages: List[BaseMessage] = [_INTERVIEWER_SYSTEM_MESSAGE]
+    if history_summary:
+        messages.append(SystemMessage(content="Earlier answers (summary):\n" + "\n".join(history_summary)))
+    messages.extend(history_messages)
+    messages.append(HumanMessage(content=turn))
+    return messages
+
+
+def generate_interviewer_reply(
+    user_answer: str,
+    chat_hist: Optional[List[Dict[str, str]]],
+    current_question: str,
+    next_question: Optional[str],
+    metrics: Optional[Dict[str, Any]] = None,
+    retriever: Optional[Any] = None,
+    history_messages: Optional[List[BaseMessage]] = None,
+    history_summary: Optional[List[str]] = None,
+) -> str:
+    """Use LangChain + Groq + Firestore-backed RAG to review the answer and ask next question / end interview."""
+    messages = build_interviewer_prompt(
+        user_answer, chat_hist, current_question, next_question, metrics, retriever,
+        history_messages=history_messages, history_summary=history_summary,
+    )
 
     last_error: Optional[Exception] = None
-    for i, client in enumerate(llm_clients, start=1):
+    for i, client in _llm_clients_in_order():
         try:
-            ai_msg = client.invoke(prompt)
+            ai_msg = client.invoke(messages)
+            _clear_llm_penalty(i)
             response_text = getattr(ai_msg, "content", str(ai_msg)).strip()
             # Clean up filler sounds from the response
             cleaned_text = clean_filler_sounds(response_text)
-            # print(f"[RAG] Response before cleaning: {response_text[:150]}")
-            # print(f"[RAG] Response after cleaning: {cleaned_text[:150]}")
+            # logger.debug(f"[RAG] Response before cleaning: {response_text[:150]}")
+            # logger.debug(f"[RAG] Response after cleaning: {cleaned_text[:150]}")
             return cleaned_text
         except Exception as exc:  # pragma: no cover - external service
             last_error = exc
-            print(f"[RAG] LLM client {i} failed: {exc}")
+            _penalize_llm_client(i, exc)
+            logger.warning(f"[RAG] LLM client {i + 1} failed: {exc}")
+
+    raise RuntimeError(f"All Groq LLM keys failed. Last error: {last_error}")
+
+
+# A sentence ends at . ! or ? followed by whitespace
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+async def astream_interviewer_sentences(
+    user_answer: str,
+    chat_hist: Optional[List[Dict[str, str]]],
+    current_question: str,
+    next_question: Optional[str],
+    metrics: Optional[Dict[str, Any]] = None,
+    retriever: Optional[Any] = None,
+    history_messages: Optional[List[BaseMessage]] = None,
+    history_summary: Optional[List[str]] = None,
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of generate_interviewer_reply: yields the cleaned reply
+    one sentence at a time as tokens arrive, so TTS can start on the first
+    sentence while the rest is still being generated.
+    Falls over to the next key only if a client fails before yielding anything.
+    """
+    # Retrieval + prompt assembly are blocking; keep them off the event loop
+    messages = await asyncio.to_thread(
+        build_interviewer_prompt,
+        user_answer, chat_hist, current_question, next_question, metrics, retriever,
+        history_messages, history_summary,
+    )
+
+    last_error: Optional[Exception] = None
+    for i, client in _llm_clients_in_order():
+        emitted = False
+        buffer = ""
+        try:
+            async for chunk in client.astream(messages):
+                buffer += getattr(chunk, "content", "") or ""
+                parts = _SENTENCE_END_RE.split(buffer)
+                # Everything but the last part is a finished sentence
+                for sentence in parts[:-1]:
+                    cleaned = clean_filler_sounds(sentence)
+                    if cleaned:
+                        emitted = True
+                        yield cleaned
+                buffer = parts[-1]
+            _clear_llm_penalty(i)
+            cleaned = clean_filler_sounds(buffer)
+            if cleaned:
+                yield cleaned
+            return
+        except Exception as exc:  # pragma: no cover - external service
+            _penalize_llm_client(i, exc)
+            if emitted:
+                raise
+            last_error = exc
+            logger.warning(f"[RAG] Streaming LLM client {i + 1} failed: {exc}")
 
     raise RuntimeError(f"All Groq LLM keys failed. Last error: {last_error}")
 
 
+class FinalScore(BaseModel):
+    """Schema the scoring LLM must answer with (Groq JSON mode)."""
+    score: int = Field(description="Overall score from 0 (very poor) to 100 (excellent)")
+    justification: str = Field(description="5-7 sentence justification of the score")
+
+
+# Same keys/order as llm_clients; include_raw keeps the reply if it doesn't match the schema
+_llm_score_clients = [
+    client.with_structured_output(FinalScore, method="json_mode", include_raw=True)
+    for client in llm_clients
+]
+
+# Fallback for replies that aren't valid JSON: "SCORE: <number>" / "JUSTIFICATION: <text>"
+_SCORE_RE = re.compile(r"SCORE\W*(\d+)(?:.*?JUSTIFICATION\W*(.+))?", re.S | re.I)
+_FIRST_NUMBER_RE = re.compile(r"\b\d+\b")
+
+
+def _parse_score_text(response: str) -> Tuple[int, str]:
+    """Best-effort (score, justification) from a free-text scoring reply."""
+    m = _SCORE_RE.search(response)
+    if m:
+        score = int(m.group(1))
+    else:
+        # If parsing fails, try to extract first number from response
+        number = _FIRST_NUMBER_RE.search(response)
+        score = int(number.group(0)) if number else 50  # Default to 50 if no number found
+    justification = (m.group(2) or "").strip() if m else ""
+    return score, justification or response
+
+
 def generate_final_score(
     chat_hist: List[Dict[str, str]],
     questions: List[str],
     metrics_by_question: Optional[Dict[int, Dict[str, Any]]] = None,
     user_id: Optional[str] = None,
     session_id: Optional[str] = None,
+    history_str: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Use LLM to evaluate the entire interview and generate a final score (0-100) with justification.
@@ -281,11 +732,13 @@ def generate_final_score(
     Args:
         chat_hist: Full conversation history including all Q&A pairs
         questions: List of all interview questions that were asked
+        history_str: Pre-formatted transcript (format_history(chat_hist)), if the caller keeps one
     
     Returns:
         Dict with 'score' (int 0-100) and 'justification' (str)
     """
-    history_str = format_history(chat_hist)
+    if history_str is None:
+        history_str = format_history(chat_hist)
     questions_str = "\n".join(f"{i+1}. {q}" for i, q in enumerate(questions))
     
     metrics_lines = []
@@ -318,7 +771,7 @@ def generate_final_score(
             else:
                 camera_block = "No camera detection events found for this session."
         except Exception as e:
-            print(f"[RAG] Error fetching camera events: {e}")
+            logger.error(f"[RAG] Error fetching camera events: {e}")
             camera_block = "Error fetching camera detection events."
 
     scoring_prompt = f"""
@@ -355,39 +808,25 @@ Provide:
 1. A numerical score from 0 to 100 (0=very poor, 100=excellent)
 2. A detailed justification (5-7 sentences, 100-120 words) explaining the score. Be specific about both delivery quality and content quality. Be candid and bluntly honest while staying professional.
 
-Format your response EXACTLY as:
-SCORE: <number>
-JUSTIFICATION: <text>
+Respond with a JSON object only, EXACTLY in this shape:
+{{"score": <number>, "justification": "<text>"}}
 """
     
     last_error: Optional[Exception] = None
-    for i, client in enumerate(llm_clients, start=1):
+    for i, _ in _llm_clients_in_order():
         try:
-            ai_msg = client.invoke(scoring_prompt)
-            response = getattr(ai_msg, "content", str(ai_msg)).strip()
-            
-            # Parse the response
-            score_line = ""
-            justification_line = ""
-            for line in response.split("\n"):
-                if line.startswith("SCORE:"):
-                    score_line = line.replace("SCORE:", "").strip()
-                elif line.startswith("JUSTIFICATION:"):
-                    justification_line = line.replace("JUSTIFICATION:", "").strip()
-            
-            # Extract score number
-            try:
-                score = int(score_line)
-                if not (0 <= score <= 100):
-                    score = max(0, min(100, score))  # Clamp to valid range
-            except (ValueError, TypeError):
-                # If parsing fails, try to extract first number from response
-                import re
-                numbers = re.findall(r'\b\d+\b', response)
-                score = int(numbers[0]) if numbers else 50  # Default to 50 if no number found
-            
+            result = _llm_score_clients[i].invoke(scoring_prompt)
+            _clear_llm_penalty(i)
+
+            parsed = result.get("parsed")
+            if parsed is not None:
+                score, justification = parsed.score, parsed.justification.strip()
+            else:
+                raw = result.get("raw")
+                score, justification = _parse_score_text(getattr(raw, "content", str(raw)).strip())
+            score = max(0, min(100, score))  # Clamp to valid range
+
             # Clean up filler sounds from justification
-            justification = justification_line if justification_line else response
             justification = clean_filler_sounds(justification)
             
             return {
@@ -397,6 +836,79 @@ JUSTIFICATION: <text>
             
         except Exception as exc:  # pragma: no cover - external service
             last_error = exc
-            print(f"[RAG] Scoring LLM client {i} failed: {exc}")
+            _penalize_llm_client(i, exc)
+            logger.warning(f"[RAG] Scoring LLM client {i + 1} failed: {exc}")
     
     raise RuntimeError(f"All Groq LLM keys failed during scoring. Last error: {last_error}")
+
+
+# ---- Final score cache ----
+
+# cache_key -> (stored_at, score_result)
+_score_cache: Dict[str, Any] = {}
+_score_cache_lock = threading.Lock()
+
+
+def _score_cache_key(
+    chat_hist: List[Dict[str, str]],
+    questions: List[str],
+    metrics_by_question: Optional[Dict[int, Dict[str, Any]]],
+    user_id: Optional[str],
+    session_id: Optional[str],
+) -> str:
+    """
+    Stable hash of the inputs a replayed interview reproduces: the candidate's
+    answers, questions, metrics and user/session. Interviewer replies are left
+    out; they're sampled (temperature 0.3) and differ on every replay.
+    """
+    answers = [m.get("content", "") for m in chat_hist if m.get("role") == "user"]
+    raw = json.dumps(
+        [answers, questions, metrics_by_question or {}, user_id, session_id],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def get_or_generate_final_score(
+    interview_id: str,
+    chat_hist: List[Dict[str, str]],
+    questions: List[str],
+    metrics_by_question: Optional[Dict[int, Dict[str, Any]]] = None,
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    history_str: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    generate_final_score with a short-lived cache keyed by the answers, so
+    replaying an identical interview (e.g. after a reconnect) reuses the score.
+    Checks the in-process cache, then interviews/{id}/scoreCache in Firestore.
+    """
+    key = _score_cache_key(chat_hist, questions, metrics_by_question, user_id, session_id)
+    now = time.monotonic()
+    with _score_cache_lock:
+        cached = _score_cache.get(key)
+        if cached and now - cached[0] < SCORE_CACHE_TTL_SECONDS:
+            logger.info("[RAG] Reusing cached final score for interview %s", interview_id)
+            return dict(cached[1])
+
+    result = load_cached_score(interview_id, key, max_age_seconds=SCORE_CACHE_TTL_SECONDS)
+    if result is not None:
+        logger.info("[RAG] Reusing Firestore-cached final score for interview %s", interview_id)
+    else:
+        result = generate_final_score(
+            chat_hist,
+            questions,
+            metrics_by_question,
+            user_id=user_id,
+            session_id=session_id,
+            history_str=history_str,
+        )
+        save_cached_score(interview_id, key, result)
+
+    with _score_cache_lock:
+        # Drop expired entries while we hold the lock
+        for k in [k for k, (ts, _r) in _score_cache.items() if now - ts >= SCORE_CACHE_TTL_SECONDS]:
+            _score_cache.pop(k, None)
+        _score_cache[key] = (now, dict(result))
+    return result
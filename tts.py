@@ -1,197 +1,490 @@
+import asyncio
 import base64
-from typing import Optional, List, Any
+import functools
+import hashlib
+import itertools
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, List, Any, Dict, Tuple
 
+from config import (
+    NON_EMPTY_GROQ_KEYS,
+    TTS_CACHE_MAXSIZE,
+    TTS_HEDGE_DELAY_SECONDS,
+    TTS_KEY_COOLDOWN_SECONDS,
+)
+from http_clients import groq_async_http_client, groq_http_client
+
+logger = logging.getLogger(__name__)
+
+# pybase64's SIMD codec is several times faster on audio-sized payloads
 try:
-    from groq import Groq
+    import pybase64
+
+    b64decode = pybase64.b64decode
+
+    def b64encode_str(data: bytes) -> str:
+        return pybase64.b64encode_as_string(data)
 except Exception as e:
-    Groq = None
-    print(f"[TTS] Warning: could not import Groq client: {e}")
+    logger.debug("[TTS] pybase64 not available, using stdlib base64: %s", e)
+    b64decode = base64.b64decode
+
+    def b64encode_str(data: bytes) -> str:
+        return base64.b64encode(data).decode("utf-8")
+
+TTS_MODEL = "playai-tts"
+TTS_VOICE = "Nia-PlayAI"
+
+
+# ---- Synthesized audio cache (LRU) ----
+
+_tts_cache: "OrderedDict[bytes, bytes]" = OrderedDict()
+_tts_cache_lock = threading.Lock()
+_tts_cache_hits = 0
+_tts_cache_misses = 0
+
+
+def _tts_cache_key(text: str, voice: str = TTS_VOICE, model: str = TTS_MODEL) -> bytes:
+    return hashlib.blake2b(f"{model}\0{voice}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+
+def _cache_get(key: bytes) -> Optional[bytes]:
+    global _tts_cache_hits, _tts_cache_misses
+    with _tts_cache_lock:
+        audio = _tts_cache.get(key)
+        if audio is None:
+            _tts_cache_misses += 1
+            return None
+        _tts_cache.move_to_end(key)
+        _tts_cache_hits += 1
+        return audio
+
+
+def _cache_put(key: bytes, audio: bytes):
+    if TTS_CACHE_MAXSIZE <= 0:
+        return
+    with _tts_cache_lock:
+        _tts_cache[key] = audio
+        _tts_cache.move_to_end(key)
+        while len(_tts_cache) > TTS_CACHE_MAXSIZE:
+            _tts_cache.popitem(last=False)
+
+
+def tts_cache_info() -> Dict[str, int]:
+    with _tts_cache_lock:
+        return {
+            "hits": _tts_cache_hits,
+            "misses": _tts_cache_misses,
+            "size": len(_tts_cache),
+            "maxsize": TTS_CACHE_MAXSIZE,
+        }
+
 
-from config import NON_EMPTY_GROQ_KEYS
+# "data:<mediatype>[;base64]," prefix of a data URL
+_DATA_URL_RE = re.compile(r"^data:[^,]*,", re.IGNORECASE)
 
 
 def _strip_data_url(s: str) -> str:
     # remove leading data:...;base64, if present
-    if not isinstance(s, str):
+    if not isinstance(s, str) or s[:5].lower() != "data:":
         return s
-    if ";base64," in s:
-        return s.split(";base64,", 1)[1]
-    if s.startswith("data:") and "," in s:
-        return s.split(",", 1)[1]
-    return s
+    return _DATA_URL_RE.sub("", s, count=1)
 
 
-def _extract_bytes(obj: Any) -> bytes:
-    """Attempt to extract raw bytes from many possible response shapes.
+# Characters allowed in (standard or URL-safe) base64
+_B64_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=_-"
+_B64_SAMPLE = 32
 
-    This function is synchronous and defensive: it will try several common
-    access patterns and return an empty bytes object on failure.
-    """
+
+def _looks_like_b64(s: str) -> bool:
+    """Cheap prefilter: the first/last 32 chars must all be base64 characters."""
+    sample = (s[:_B64_SAMPLE] + s[-_B64_SAMPLE:]).encode("ascii", "replace")
+    # Deleting every alphabet byte leaves nothing iff the sample is clean
+    return not sample.translate(None, _B64_ALPHABET)
+
+
+def _b64_payload(s: str) -> str:
+    # data URL prefix and any whitespace (line-wrapped base64) removed
+    return "".join(_strip_data_url(s).split())
+
+
+def _from_str(obj: str) -> bytes:
+    # base64 if it strictly decodes, otherwise raw text
     try:
-        # direct bytes
-        if isinstance(obj, (bytes, bytearray)):
-            return bytes(obj)
+        return b64decode(_b64_payload(obj), validate=True)
+    except Exception:
+        return _strip_data_url(obj).strip().encode("utf-8")
 
-        # if it's a string, assume it's base64 or raw text
-        if isinstance(obj, str):
-            s = _strip_data_url(obj).strip()
-            try:
-                return base64.b64decode(s)
-            except Exception:
-                return s.encode("utf-8")
-
-        # dict-like objects: check common keys
-        if isinstance(obj, dict):
-            for key in ("audio", "data", "result", "audio_base64", "base64", "content"):
-                if key in obj:
-                    val = obj[key]
-                    b = _extract_bytes(val)
-                    if b:
-                        return b
-            # scan for long base64-like strings
-            for v in obj.values():
-                if isinstance(v, str) and len(v) > 100:
-                    try:
-                        return base64.b64decode(_strip_data_url(v))
-                    except Exception:
-                        continue
-
-        # objects with common attributes
-        for attr in ("content", "raw", "data", "audio", "body"):
-            if hasattr(obj, attr):
-                try:
-                    val = getattr(obj, attr)
-                    b = _extract_bytes(val)
-                    if b:
-                        return b
-                except Exception:
-                    pass
-
-        # file-like objects with read() (avoid treating dicts as file-like)
-        if not isinstance(obj, dict) and hasattr(obj, "read") and callable(getattr(obj, "read")):
+
+# Dict keys that commonly hold the audio, in priority order; the frozenset
+# lets one C-level intersection find which are present
+_AUDIO_KEYS = ("audio", "data", "result", "audio_base64", "base64", "content")
+_AUDIO_KEY_SET = frozenset(_AUDIO_KEYS)
+
+
+def _present_audio_keys(obj: dict) -> List[str]:
+    present = obj.keys() & _AUDIO_KEY_SET
+    if not present:
+        return []
+    return [key for key in _AUDIO_KEYS if key in present]
+
+
+def _from_dict(obj: dict) -> bytes:
+    # check common keys
+    for key in _present_audio_keys(obj):
+        b = _extract_bytes(obj[key])
+        if b:
+            return b
+    # scan for long base64-like strings (junk is rejected before decoding)
+    for v in obj.values():
+        if isinstance(v, str) and len(v) > 100:
+            v = _b64_payload(v)
+            if not _looks_like_b64(v):
+                continue
             try:
-                chunk = obj.read()
-                return _extract_bytes(chunk)
+                return b64decode(v, validate=True)
             except Exception:
-                pass
+                continue
+    return b""
+
+
+def _from_stream(obj: Any) -> bytes:
+    return b"".join(obj.iter_bytes())
+
+
+# Attributes that commonly hold the payload on SDK response objects, in priority order
+_PAYLOAD_ATTRS = ("content", "raw", "data", "audio", "body")
 
-        # iterables of bytes/bytearray
+_ExtractFn = Callable[[Any], bytes]
+
+
+def _from_attrs(obj: Any) -> bytes:
+    """Try the payload attributes present on this object, in priority order."""
+    for attr in _PAYLOAD_ATTRS:
         try:
-            if hasattr(obj, "__iter__") and not isinstance(obj, (str, bytes, bytearray, dict)):
-                # try to join bytes if possible
-                parts = []
-                for item in obj:
-                    if isinstance(item, (bytes, bytearray)):
-                        parts.append(bytes(item))
-                    else:
-                        # try extracting recursively
-                        b = _extract_bytes(item)
-                        if b:
-                            parts.append(b)
-                if parts:
-                    return b"".join(parts)
+            b = _extract_bytes(getattr(obj, attr))
         except Exception:
-            pass
+            continue
+        if b:
+            return b
+    return b""
+
+
+def _from_content(obj: Any) -> bytes:
+    return _extract_bytes(obj.content)
+
+
+# type(obj) -> extractor, for the builtins and known SDK response classes.
+# Any other type is walked with _from_attrs on every call: instances of one
+# class (e.g. SimpleNamespace) don't all carry the same attributes.
+_EXTRACTORS: Dict[type, _ExtractFn] = {
+    bytes: bytes,
+    bytearray: bytes,
+    str: _from_str,
+    dict: _from_dict,
+}
+
+
+
+def _register_sdk_extractors():
+    """Add the SDK's binary responses: streamed (no .content until read) and buffered."""
+    try:
+        from groq._response import StreamedBinaryAPIResponse
 
+        _EXTRACTORS.setdefault(StreamedBinaryAPIResponse, _from_stream)
     except Exception:
         pass
+    try:
+        from groq._legacy_response import HttpxBinaryResponseContent
 
-    return b""
+        _EXTRACTORS.setdefault(HttpxBinaryResponseContent, _from_content)
+    except Exception:
+        pass
 
 
-# Instantiate Groq clients for TTS (filter out empty entries)
-clients: List[Any] = []
-if Groq is not None:
+def _extract_bytes(obj: Any) -> bytes:
+    """Attempt to extract raw bytes from many possible response shapes.
+
+    Known types dispatch through _EXTRACTORS; subclasses of the builtins use
+    their base's extractor, anything else falls back to _from_attrs.
+    Defensive: returns an empty bytes object on failure.
+    """
+    extractor = _EXTRACTORS.get(type(obj))
+    if extractor is None:
+        for base in (bytes, bytearray, str, dict):
+            if isinstance(obj, base):
+                extractor = _EXTRACTORS[base]
+                break
+        else:
+            extractor = _from_attrs
+    try:
+        return extractor(obj)
+    except Exception:
+        return b""
+
+
+def _extract_audio(tts_response: Any) -> bytes:
+    audio = _extract_bytes(tts_response)
+    if not audio:
+        raise RuntimeError(f"TTS returned empty audio payload (type={type(tts_response)})")
+    return audio
+
+
+def _make_clients(factory: Callable[[str], Any], kind: str) -> Tuple[Optional[Any], ...]:
+    """
+    One slot per configured key, None where the client failed to build, so
+    index i is the same key in the sync and async tuples (and in the shared
+    cooldown / working-key state). Empty if no client could be built.
+    """
+    built: List[Optional[Any]] = []
     for k in NON_EMPTY_GROQ_KEYS:
-        if k:
-            try:
-                clients.append(Groq(api_key=k))
-            except Exception as e:
-                print(f"[TTS] Failed to initialize Groq client for a key: {e}")
+        try:
+            built.append(factory(k))
+        except Exception as e:
+            logger.warning(f"[TTS] Failed to initialize {kind} Groq client for a key: {e}")
+            built.append(None)
+    return tuple(built) if any(c is not None for c in built) else ()
+
+
+# Groq clients are built (and the SDK imported) on the first TTS call, so
+# importing tts doesn't construct one client per key up front
+
+
+@functools.lru_cache(maxsize=1)
+def _get_clients() -> Tuple[Optional[Any], ...]:
+    """Sync TTS clients, all on the shared keep-alive pool."""
+    try:
+        from groq import Groq
+    except Exception as e:
+        logger.warning(f"[TTS] Warning: could not import Groq client: {e}")
+        return ()
+    _register_sdk_extractors()
+    built = _make_clients(lambda k: Groq(api_key=k, http_client=groq_http_client), "sync")
+    logger.info("[TTS] Initialized %s TTS client(s).", sum(c is not None for c in built))
+    return built
+
+
+@functools.lru_cache(maxsize=1)
+def _get_async_clients() -> Tuple[Optional[Any], ...]:
+    """Async clients (same key slots as _get_clients) on the shared keep-alive pool."""
+    try:
+        from groq import AsyncGroq
+    except Exception as e:
+        logger.warning(f"[TTS] Warning: could not import AsyncGroq client: {e}")
+        return ()
+    _register_sdk_extractors()
+    return _make_clients(lambda k: AsyncGroq(api_key=k, http_client=groq_async_http_client), "async")
 
-print(f"[TTS] Initialized {len(clients)} TTS client(s).")
 
-# Track which client is working in the current session
+# Track which key is working in the current session
 _working_client_index: Optional[int] = None
 
+# key index -> monotonic time until which the key is rate-limited
+_cooldown_until: List[float] = [0.0] * len(NON_EMPTY_GROQ_KEYS)
 
-def tts_text_to_base64_wav(text: str) -> Optional[str]:
+
+def _key_order(clients: Tuple[Optional[Any], ...]) -> List[int]:
     """
-    Use Groq TTS clients to convert text → base64 wav.
+    Indices of the built clients to try: starting from the working key and
+    wrapping around, skipping rate-limited keys (which are only tried last,
+    soonest-free first).
+    """
+    n = len(clients)
+    start = _working_client_index if _working_client_index is not None and _working_client_index < n else 0
+    now = time.monotonic()
+    order = [
+        i for i in itertools.islice(itertools.cycle(range(n)), start, start + n)
+        if clients[i] is not None
+    ]
+    ready = [i for i in order if _cooldown_until[i] <= now]
+    cooling = sorted((i for i in order if _cooldown_until[i] > now), key=lambda i: _cooldown_until[i])
+    return ready + cooling
+
+
+def _record_failure(i: int, e: Exception):
+    """Rate limits (429) put the key in cooldown for Retry-After; other errors just move on."""
+    global _working_client_index
+    if _working_client_index == i:
+        _working_client_index = None
+    if getattr(e, "status_code", None) != 429:
+        return
+    cooldown = TTS_KEY_COOLDOWN_SECONDS
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    retry_after = headers.get("retry-after") if headers is not None else None
+    if retry_after:
+        try:
+            cooldown = float(retry_after)
+        except ValueError:
+            pass
+    _cooldown_until[i] = time.monotonic() + cooldown
+    logger.warning(f"[TTS] Client {i + 1} rate-limited; skipping it for {cooldown:.0f}s")
+
+
+def _speech_kwargs(text: str) -> Dict[str, Any]:
+    return {"model": TTS_MODEL, "voice": TTS_VOICE, "response_format": "wav", "input": text}
+
+
+def _tts(text: str, use_cache: bool = True) -> Optional[bytes]:
+    """
+    Use Groq TTS clients to convert text → raw wav bytes.
+    Repeated texts are served from an in-memory LRU (TTS_CACHE_MAXSIZE)
+    unless use_cache is False.
     Once a client succeeds, it will be used for subsequent calls in the session.
-    If the working client fails, it will try the remaining clients.
+    If the working client fails, it will try the remaining clients, skipping
+    keys that are cooling down after a rate limit.
     Returns None if all fail.
     """
     global _working_client_index
-    
+
+    clients = _get_clients()
     if not clients:
-        print("[TTS] No Groq API keys configured for TTS.")
+        logger.warning("[TTS] No Groq API keys configured for TTS.")
         return None
 
+    cache_key = _tts_cache_key(text) if use_cache else None
+    cached = _cache_get(cache_key) if use_cache else None
+    if cached is not None:
+        return cached
+
     last_error = None
-    
-    # If we have a known working client, try it first
-    tried_indices = set()
-    
-    if _working_client_index is not None:
-        i = _working_client_index
+    # Checked once so production skips the per-client debug calls entirely
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    for i in _key_order(clients):
         client = clients[i]
-        tried_indices.add(i)
         try:
-            print(f"[TTS] Using previously successful client {i + 1}/{len(clients)}...")
-            tts_response = client.audio.speech.create(
-                model="playai-tts",
-                voice="Nia-PlayAI",
-                response_format="wav",
-                input=text,
-            )
+            if debug:
+                logger.debug("[TTS] Trying client %s/%s...", i + 1, len(clients))
+            speech = client.audio.speech
+            if hasattr(speech, "with_streaming_response"):
+                # Read the WAV body straight off the streamed response instead
+                # of going through the SDK's BinaryAPIResponse wrapper
+                with speech.with_streaming_response.create(**_speech_kwargs(text)) as resp:
+                    audio = resp.read()
+                if not audio:
+                    raise RuntimeError("TTS returned empty audio payload")
+            else:
+                audio = _extract_audio(speech.create(**_speech_kwargs(text)))
 
-            audio_data = _extract_bytes(tts_response)
-
-            if not audio_data:
-                raise RuntimeError(f"TTS returned empty audio payload (type={type(tts_response)})")
-
-            enc_aud = base64.b64encode(audio_data).decode("utf-8")
-            print(f"[TTS] ✓ Client {i + 1} succeeded (response type: {type(tts_response)})")
-            return enc_aud
+            if debug:
+                logger.debug("[TTS] ✓ Client %s succeeded", i + 1)
+            # Remember this working client for future calls
+            _working_client_index = i
+            if use_cache:
+                _cache_put(cache_key, audio)
+            return audio
 
         except Exception as e:
             last_error = e
-            print(f"[TTS] ✗ Previously working client {i + 1} failed: {e}")
-            print(f"[TTS] Trying other clients...")
-            _working_client_index = None
-
-    # Try all clients to find a working one
-    for i, client in enumerate(clients):
-        # Skip the one we just tried
-        if i in tried_indices:
+            logger.warning(f"[TTS] ✗ Client {i + 1} failed: {e}")
+            _record_failure(i, e)
+            # Continue to next client instead of stopping
             continue
-            
-        try:
-            print(f"[TTS] Trying client {i + 1}/{len(clients)}...")
-            tts_response = client.audio.speech.create(
-                model="playai-tts",
-                voice="Nia-PlayAI",
-                response_format="wav",
-                input=text,
-            )
 
-            audio_data = _extract_bytes(tts_response)
+    logger.error(f"[TTS] All {len(clients)} TTS client(s) failed. Last error: {last_error}")
+    return None
 
-            if not audio_data:
-                raise RuntimeError(f"TTS returned empty audio payload (type={type(tts_response)})")
 
-            enc_aud = base64.b64encode(audio_data).decode("utf-8")
-            print(f"[TTS] ✓ Client {i + 1} succeeded (response type: {type(tts_response)})")
-            # Remember this working client for future calls
-            _working_client_index = i
-            return enc_aud
+def tts_text_to_wav_bytes(text: str, use_cache: bool = True) -> Optional[bytes]:
+    """
+    Convert text → raw wav bytes (see _tts).
+    Returns None if all TTS clients fail.
+    """
+    return _tts(text, use_cache)
 
-        except Exception as e:
-            last_error = e
-            print(f"[TTS] ✗ Client {i + 1} failed: {e}")
-            # Continue to next client instead of stopping
-            continue
 
-    print(f"[TTS] All {len(clients)} TTS client(s) failed. Last error: {last_error}")
+def tts_text_to_base64_wav(text: str) -> Optional[str]:
+    """
+    Convert text → base64 wav (see _tts).
+    Returns None if all TTS clients fail.
+    """
+    audio = _tts(text)
+    return b64encode_str(audio) if audio is not None else None
+
+
+async def _atts_once(client: Any, text: str) -> bytes:
+    speech = client.audio.speech
+    if not hasattr(speech, "with_streaming_response"):
+        return _extract_audio(await speech.create(**_speech_kwargs(text)))
+    async with speech.with_streaming_response.create(**_speech_kwargs(text)) as resp:
+        audio = await resp.read()
+    if not audio:
+        raise RuntimeError("TTS returned empty audio payload")
+    return audio
+
+
+async def _atts(text: str, use_cache: bool = True) -> Optional[bytes]:
+    """
+    Async _tts with hedged requests: walks keys in the same order (working
+    key first, rate-limited keys last) and starts the next key whenever a
+    request fails or hasn't answered within TTS_HEDGE_DELAY_SECONDS.
+    The first audio wins; the other in-flight requests are cancelled.
+    Returns None if all fail.
+    """
+    global _working_client_index
+
+    async_clients = _get_async_clients()
+    if not async_clients:
+        return await asyncio.to_thread(_tts, text, use_cache)
+
+    cache_key = _tts_cache_key(text) if use_cache else None
+    cached = _cache_get(cache_key) if use_cache else None
+    if cached is not None:
+        return cached
+
+    to_launch = iter(_key_order(async_clients))
+
+    in_flight = {}  # task -> client index
+    last_error = None
+
+    def _launch_next() -> bool:
+        i = next(to_launch, None)
+        if i is None:
+            return False
+        in_flight[asyncio.create_task(_atts_once(async_clients[i], text))] = i
+        return True
+
+    _launch_next()
+    try:
+        while in_flight:
+            done, _ = await asyncio.wait(
+                in_flight, timeout=TTS_HEDGE_DELAY_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                # Slow key: hedge with the next one, keep waiting on both
+                _launch_next()
+                continue
+            for task in done:
+                i = in_flight.pop(task)
+                try:
+                    audio = task.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"[TTS] ✗ Client {i + 1} failed: {e}")
+                    _record_failure(i, e)
+                    _launch_next()
+                    continue
+                _working_client_index = i
+                if use_cache:
+                    _cache_put(cache_key, audio)
+                return audio
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+    logger.error(f"[TTS] All {len(async_clients)} TTS client(s) failed. Last error: {last_error}")
     return None
+
+
+async def tts_text_to_wav_bytes_async(text: str, use_cache: bool = True) -> Optional[bytes]:
+    """Async tts_text_to_wav_bytes (see _atts)."""
+    return await _atts(text, use_cache)
+
+
+async def tts_text_to_base64_wav_async(text: str) -> Optional[str]:
+    """Async tts_text_to_base64_wav (see _atts)."""
+    audio = await _atts(text)
+    return b64encode_str(audio) if audio is not None else None